@@ -7,12 +7,13 @@ from routes.auth import auth_bp
 from routes.users import users_bp
 from routes.documents import documents_bp
 from errors import APIError
+from services import jobs, identity, passwords, sweeper, query_stats, metrics, serialization, search, public_files, quota, revocation
 import os
 
 # Cargar variables de entorno
 load_dotenv()
 
-def create_app():
+def create_app(config=None):
     app = Flask(__name__)
     CORS(app, resources={r"/api/*": {"origins": "http://localhost:3000"}})
 
@@ -23,6 +24,34 @@ def create_app():
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
     app.config['UPLOAD_FOLDER'] = os.getenv('UPLOAD_FOLDER', 'uploads')
     app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max-limit
+    # Descargas: '' las sirve Flask, 'x-sendfile' (Apache/lighttpd) o 'x-accel' (nginx) las delega al proxy
+    app.config['DOWNLOAD_OFFLOAD'] = os.getenv('DOWNLOAD_OFFLOAD', '')
+    app.config['X_ACCEL_PREFIX'] = os.getenv('X_ACCEL_PREFIX', '/protected/')
+    app.config['IDENTITY_CACHE_SIZE'] = int(os.getenv('IDENTITY_CACHE_SIZE', 1024))
+    app.config['IDENTITY_CACHE_TTL'] = int(os.getenv('IDENTITY_CACHE_TTL', 60))  # segundos
+    app.config['REVOCATION_SYNC_INTERVAL'] = int(os.getenv('REVOCATION_SYNC_INTERVAL', 5))  # segundos hasta ver revocaciones de otros procesos
+    app.config['REVOCATION_FILTER_CAPACITY'] = int(os.getenv('REVOCATION_FILTER_CAPACITY', 100000))
+    app.config['REVOCATION_FILTER_ERROR_RATE'] = float(os.getenv('REVOCATION_FILTER_ERROR_RATE', 0.001))
+    app.config['PASSWORD_HASH_METHOD'] = os.getenv('PASSWORD_HASH_METHOD', passwords.DEFAULT_METHOD)
+    app.config['PASSWORD_HASH_WORKERS'] = int(os.getenv('PASSWORD_HASH_WORKERS', 2))
+    app.config['PASSWORD_HASH_MAX_PENDING'] = int(os.getenv('PASSWORD_HASH_MAX_PENDING', 32))
+    app.config['DOCUMENT_JOB_WORKERS'] = int(os.getenv('DOCUMENT_JOB_WORKERS', 2))  # 0 desactiva el procesamiento en segundo plano
+    app.config['SLOW_QUERY_MS'] = int(os.getenv('SLOW_QUERY_MS', 200))
+    app.config['SQL_DEBUG_HEADERS'] = os.getenv('SQL_DEBUG_HEADERS', 'false').lower() == 'true'  # X-SQL-* en cada respuesta
+    app.config['METRICS_DIR'] = os.getenv('METRICS_DIR', '')  # directorio compartido si hay varios workers
+    app.config['PUBLIC_CACHE_TTL'] = int(os.getenv('PUBLIC_CACHE_TTL', 30))  # segundos
+    app.config['PUBLIC_CACHE_MAX_BYTES'] = int(os.getenv('PUBLIC_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+    app.config['PUBLIC_CACHE_MAX_FILE'] = int(os.getenv('PUBLIC_CACHE_MAX_FILE', 256 * 1024))
+    app.config['PUBLIC_CACHE_MAX_AGE'] = int(os.getenv('PUBLIC_CACHE_MAX_AGE', 86400))  # Cache-Control de /shared
+    app.config['ARCHIVE_MAX_ENTRIES'] = int(os.getenv('ARCHIVE_MAX_ENTRIES', 10000))
+    app.config['ARCHIVE_MAX_RATIO'] = int(os.getenv('ARCHIVE_MAX_RATIO', 100))  # descomprimido / comprimido
+    app.config['ARCHIVE_MAX_MEMBER_SIZE'] = int(os.getenv('ARCHIVE_MAX_MEMBER_SIZE', 512 * 1024 * 1024))
+    app.config['STORAGE_QUOTA_BYTES'] = int(os.getenv('STORAGE_QUOTA_BYTES', 1024 * 1024 * 1024))  # por usuario; 0 = sin límite
+    app.config['QUOTA_RECONCILE_INTERVAL'] = int(os.getenv('QUOTA_RECONCILE_INTERVAL', 86400))  # segundos; 0 lo desactiva
+    app.config['FILE_SWEEPER_INTERVAL'] = int(os.getenv('FILE_SWEEPER_INTERVAL', 60))  # segundos; 0 lo desactiva
+    if config:
+        app.config.update(config)
+    app.config['USE_X_SENDFILE'] = app.config['DOWNLOAD_OFFLOAD'] == 'x-sendfile'
 
     # Asegurar que existen los directorios de uploads
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
@@ -30,8 +59,18 @@ def create_app():
     os.makedirs(os.path.join(app.config['UPLOAD_FOLDER'], 'documents'), exist_ok=True)
 
     # Inicializar extensiones
+    serialization.init_app(app)
     db.init_app(app)
+    query_stats.init_app(app, db)
+    metrics.init_app(app)
     jwt = JWTManager(app)
+    identity.init_app(app, jwt)
+    revocation.init_app(app, jwt)
+    passwords.init_app(app)
+    public_files.init_app(app)
+    jobs.init_app(app)
+    sweeper.init_app(app)
+    quota.init_app(app)
 
     # Registrar blueprints
     app.register_blueprint(auth_bp, url_prefix='/api/auth')
@@ -43,6 +82,8 @@ def create_app():
     def handle_api_error(error):
         response = jsonify(error.to_dict())
         response.status_code = error.status_code
+        if error.headers:
+            response.headers.update(error.headers)
         return response
     
     @app.errorhandler(404)
@@ -65,4 +106,5 @@ if __name__ == '__main__':
     app = create_app()
     with app.app_context():
         db.create_all()
+        search.ensure_index()
     app.run(debug=True, port=5000) 
\ No newline at end of file
@@ -0,0 +1,271 @@
+# Benchmark de la API en proceso: cada escenario arranca create_app() en un
+# proceso nuevo contra SQLite (o DATABASE_URL, p. ej. un Postgres local),
+# siembra datos y lanza peticiones con el test client a la concurrencia pedida.
+# Uso (desde backend/):
+#   python -m benchmarks.api --concurrency 8 --requests 400
+#   python -m benchmarks.api --save-baseline          # guarda benchmarks/baseline.json
+#   python -m benchmarks.api --scenarios list,download --tolerance 15
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import resource
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'baseline.json')
+SCENARIOS = ['auth', 'me', 'list', 'list_all', 'upload', 'download']
+
+def _auth_headers(token):
+    return {'Authorization': f'Bearer {token}'}
+
+def _register(client, email):
+    response = client.post('/api/auth/register', json={
+        'email': email,
+        'password': 'benchmark-password',
+        'first_name': 'Bench',
+        'last_name': 'Mark'
+    })
+    assert response.status_code == 201, response.get_data(as_text=True)
+    return response.get_json()
+
+def _seed_documents(app, user_id, count):
+    from models import db
+    from models.document import Document
+
+    with app.app_context():
+        rows = [
+            {
+                'filename': f'seed-{i}.pdf',
+                'original_filename': f'apuntes-{i}.pdf',
+                'file_path': f'uploads/documents/{user_id}/seed-{i}.pdf',
+                'file_type': 'pdf',
+                'file_size': 1024 * (i % 500 + 1),
+                'description': f'Documento de prueba {i}',
+                'is_public': i % 10 == 0,
+                'status': 'ready',
+                'user_id': user_id,
+            }
+            for i in range(count)
+        ]
+        for start in range(0, len(rows), 1000):
+            db.session.execute(db.insert(Document), rows[start:start + 1000])
+        db.session.commit()
+
+def _setup(name, app, client, options):
+    state = {'counter': itertools.count()}
+    if name == 'auth':
+        return state
+
+    user = _register(client, 'seed@example.com')
+    state['headers'] = _auth_headers(user['access_token'])
+    user_id = user['user']['id']
+
+    if name in ('list', 'list_all'):
+        _seed_documents(app, user_id, options.documents)
+    elif name == 'download':
+        payload = os.urandom(options.file_mb * 1024 * 1024)
+        response = client.post(
+            '/api/documents/upload',
+            data={'file': (BytesIO(payload), 'descarga.pdf')},
+            headers=state['headers'],
+            content_type='multipart/form-data'
+        )
+        assert response.status_code == 201, response.get_data(as_text=True)
+        state['document_id'] = response.get_json()['id']
+    elif name == 'upload':
+        # Contenido distinto en cada subida para no medir solo la deduplicación
+        state['payload'] = os.urandom(options.file_mb * 1024 * 1024)
+    return state
+
+def _step(name, client, state):
+    if name == 'auth':
+        email = f'user{next(state["counter"])}-{os.getpid()}@example.com'
+        _register(client, email)
+        response = client.post('/api/auth/login', json={'email': email, 'password': 'benchmark-password'})
+        if response.status_code != 200:
+            return response
+        token = response.get_json()['access_token']
+        return client.get('/api/auth/me', headers=_auth_headers(token))
+    if name == 'me':
+        return client.get('/api/auth/me', headers=state['headers'])
+    if name == 'list':
+        # Recorre unas cuantas páginas siguiendo el cursor
+        cursor = None
+        for _ in range(5):
+            url = '/api/documents/?limit=50' + (f'&cursor={cursor}' if cursor else '')
+            response = client.get(url, headers=state['headers'])
+            cursor = response.get_json()['next_cursor']
+            if not cursor:
+                break
+        return response
+    if name == 'list_all':
+        # La respuesta va en streaming: la serialización cuenta al leer el cuerpo
+        response = client.get('/api/documents/', headers=state['headers'])
+        response.get_data()
+        response.close()
+        return response
+    if name == 'upload':
+        payload = next(state['counter']).to_bytes(8, 'big') + state['payload'][8:]
+        return client.post(
+            '/api/documents/upload',
+            data={'file': (BytesIO(payload), 'subida.pdf')},
+            headers=state['headers'],
+            content_type='multipart/form-data'
+        )
+    if name == 'download':
+        response = client.get(f'/api/documents/{state["document_id"]}/download', headers=state['headers'])
+        response.get_data()
+        response.close()
+        return response
+    raise ValueError(name)
+
+def _percentile(ordered, pct):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+def _run_scenario(name, options, queue):
+    workdir = tempfile.mkdtemp(prefix=f'bench-{name}-')
+    os.chdir(workdir)
+    database_url = options.database_url or f'sqlite:///{os.path.join(workdir, "bench.db")}'
+
+    from app import create_app
+    from models import db
+
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': database_url,
+        'SQLALCHEMY_ENGINE_OPTIONS': {'connect_args': {'timeout': 30}} if database_url.startswith('sqlite') else {},
+        'DOCUMENT_JOB_WORKERS': 0,
+        'FILE_SWEEPER_INTERVAL': 0,
+        # Sin cuota: el escenario de subidas pasa de 1 GB con los valores por defecto
+        'STORAGE_QUOTA_BYTES': 0,
+        'QUOTA_RECONCILE_INTERVAL': 0,
+        'PASSWORD_HASH_METHOD': options.password_method,
+        'PASSWORD_HASH_MAX_PENDING': options.concurrency * 2,
+    })
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+
+    state = _setup(name, app, app.test_client(), options)
+    requests = itertools.count()
+
+    def worker():
+        client = app.test_client()
+        latencies = []
+        errors = 0
+        while next(requests) < options.requests:
+            start = time.perf_counter()
+            response = _step(name, client, state)
+            elapsed = time.perf_counter() - start
+            # Las respuestas de error no cuentan como muestras de latencia
+            if response.status_code >= 400:
+                errors += 1
+            else:
+                latencies.append(elapsed)
+        return latencies, errors
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=options.concurrency) as executor:
+        results = [f.result() for f in [executor.submit(worker) for _ in range(options.concurrency)]]
+    elapsed = time.perf_counter() - start
+
+    successful = sorted(latency for batch, _ in results for latency in batch)
+    latencies = successful or [0.0]
+    queue.put({
+        'requests': len(successful),
+        'errors': sum(errors for _, errors in results),
+        'rps': round(len(successful) / elapsed, 1),
+        'p50_ms': round(_percentile(latencies, 50) * 1000, 2),
+        'p95_ms': round(_percentile(latencies, 95) * 1000, 2),
+        'p99_ms': round(_percentile(latencies, 99) * 1000, 2),
+        'mean_ms': round(statistics.fmean(latencies) * 1000, 2),
+        # ru_maxrss está en KB en Linux
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    })
+
+def run(name, options):
+    # Un proceso por escenario para que el pico de RSS sea solo suyo
+    context = multiprocessing.get_context('spawn')
+    queue = context.Queue()
+    process = context.Process(target=_run_scenario, args=(name, options, queue))
+    process.start()
+    process.join()
+    if process.exitcode != 0:
+        raise RuntimeError(f'El escenario {name} terminó con código {process.exitcode}')
+    return queue.get()
+
+# Métricas en las que subir es empeorar (y al revés para rps)
+LOWER_IS_BETTER = ('p50_ms', 'p95_ms', 'p99_ms', 'peak_rss_mb')
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for name, current in results.items():
+        # Un escenario con errores no es comparable: cuenta como regresión
+        if current['errors']:
+            print(f'  {name:10} errores     {current["errors"]:>10}  REGRESIÓN')
+            regressions.append((name, 'errors'))
+            continue
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        for metric in LOWER_IS_BETTER + ('rps',):
+            before, after = previous[metric], current[metric]
+            if not before:
+                continue
+            change = (after - before) / before * 100
+            worse = change > tolerance if metric in LOWER_IS_BETTER else change < -tolerance
+            print(f'  {name:10} {metric:12} {before:>10} -> {after:>10} ({change:+.1f}%)' + ('  REGRESIÓN' if worse else ''))
+            if worse:
+                regressions.append((name, metric))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS))
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--documents', type=int, default=5000, help='documentos sembrados para los listados')
+    parser.add_argument('--file-mb', type=int, default=4, help='tamaño de los archivos de subida/descarga')
+    parser.add_argument('--password-method', default='scrypt:32768:8:1')
+    parser.add_argument('--database-url', default=os.getenv('BENCH_DATABASE_URL'))
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--tolerance', type=float, default=10.0, help='% de empeoramiento permitido')
+    options = parser.parse_args()
+
+    results = {}
+    for name in options.scenarios.split(','):
+        results[name] = run(name, options)
+        r = results[name]
+        print(f'{name:10} {r["requests"]:>6} req  {r["rps"]:>8} req/s  p50 {r["p50_ms"]:>8}ms  '
+              f'p95 {r["p95_ms"]:>8}ms  p99 {r["p99_ms"]:>8}ms  rss {r["peak_rss_mb"]:>7}MB  errores {r["errors"]}')
+
+    failed = [name for name, r in results.items() if r['errors']]
+    if failed:
+        print(f'Escenarios con errores: {", ".join(failed)}')
+
+    if options.save_baseline:
+        if failed:
+            print('No se guarda la línea base con errores')
+            sys.exit(1)
+        with open(options.baseline, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f'Línea base guardada en {options.baseline}')
+        return
+
+    if os.path.exists(options.baseline):
+        with open(options.baseline) as f:
+            baseline = json.load(f)
+        print(f'Comparación con {options.baseline} (tolerancia {options.tolerance}%):')
+        if compare(results, baseline, options.tolerance):
+            sys.exit(1)
+    elif failed:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+# Benchmark del índice BM25: siembra N trozos para un usuario y mide la
+# latencia de search(). Uso (desde backend/):
+#   python -m benchmarks.retrieval --chunks 20000 --queries 200
+import argparse
+import os
+import random
+import statistics
+import time
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+os.environ.setdefault('DOCUMENT_JOB_WORKERS', '0')
+os.environ.setdefault('FILE_SWEEPER_INTERVAL', '0')
+
+from app import create_app
+from models import db
+from models.user import User
+from models.document import Document
+from services import retrieval
+
+def build_vocabulary(size, rng):
+    letters = 'abcdefghijklmnopqrstuvwxyz'
+    return [''.join(rng.choice(letters) for _ in range(rng.randint(3, 10))) for _ in range(size)]
+
+def seed(user, chunks, vocabulary, rng):
+    # Distribución tipo Zipf: pocas palabras muy frecuentes y una cola larga
+    weights = [1 / (rank + 1) for rank in range(len(vocabulary))]
+    words_per_doc = 16000
+    docs = max(1, chunks // ((words_per_doc - retrieval.CHUNK_OVERLAP) // (retrieval.CHUNK_SIZE - retrieval.CHUNK_OVERLAP)))
+    for i in range(docs):
+        document = Document(
+            filename=f'bench-{i}.txt',
+            original_filename=f'bench-{i}.txt',
+            file_path=f'bench-{i}.txt',
+            file_type='txt',
+            file_size=0,
+            user_id=user.id
+        )
+        db.session.add(document)
+        db.session.flush()
+        text = ' '.join(rng.choices(vocabulary, weights=weights, k=words_per_doc))
+        retrieval.index_document(document, text=text)
+        db.session.commit()
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--chunks', type=int, default=20000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--vocabulary', type=int, default=30000)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        user = User(email='bench@example.com', username='bench', first_name='Bench', last_name='Mark')
+        db.session.add(user)
+        db.session.commit()
+
+        vocabulary = build_vocabulary(args.vocabulary, rng)
+        start = time.perf_counter()
+        seed(user, args.chunks, vocabulary, rng)
+        stats = db.session.get(retrieval.IndexStats, user.id)
+        print(f'indexados {stats.chunk_count} trozos en {time.perf_counter() - start:.1f}s')
+
+        samples = []
+        for _ in range(args.queries):
+            query = ' '.join(rng.choices(vocabulary[:5000], k=3))
+            start = time.perf_counter()
+            retrieval.search(user.id, query, k=5, max_tokens=1000)
+            samples.append((time.perf_counter() - start) * 1000)
+
+        print(f'consultas: {len(samples)}')
+        print(f'p50: {statistics.median(samples):.2f}ms  p95: {percentile(samples, 95):.2f}ms  '
+              f'p99: {percentile(samples, 99):.2f}ms')
+
+if __name__ == '__main__':
+    main()
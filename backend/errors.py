@@ -1,9 +1,10 @@
 class APIError(Exception):
-    def __init__(self, message, status_code=400, payload=None):
+    def __init__(self, message, status_code=400, payload=None, headers=None):
         super().__init__()
         self.message = message
         self.status_code = status_code
         self.payload = payload
+        self.headers = headers
 
     def to_dict(self):
         rv = dict(self.payload or ())
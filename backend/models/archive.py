@@ -0,0 +1,30 @@
+from models import db
+
+class ArchiveEntry(db.Model):
+    __tablename__ = 'archive_entries'
+    __table_args__ = (
+        db.UniqueConstraint('document_id', 'position', name='uq_archive_entries_document_position'),
+    )
+
+    # Tabla de contenidos de un zip/7z/rar, leída una vez del directorio central
+    id = db.Column(db.Integer, primary_key=True)
+    document_id = db.Column(db.Integer, db.ForeignKey('documents.id', ondelete='CASCADE'), nullable=False, index=True)
+    position = db.Column(db.Integer, nullable=False)
+    name = db.Column(db.String(1024), nullable=False)
+    is_dir = db.Column(db.Boolean, nullable=False, default=False)
+    size = db.Column(db.BigInteger, nullable=False)  # descomprimido
+    compressed_size = db.Column(db.BigInteger, nullable=False)
+    header_offset = db.Column(db.BigInteger)  # cabecera local en zip; None en 7z/rar
+    compress_type = db.Column(db.Integer)
+    crc = db.Column(db.BigInteger)
+    encrypted = db.Column(db.Boolean, nullable=False, default=False)
+
+    def to_dict(self):
+        return {
+            'position': self.position,
+            'name': self.name,
+            'is_dir': self.is_dir,
+            'size': self.size,
+            'compressed_size': self.compressed_size,
+            'encrypted': self.encrypted
+        }
@@ -0,0 +1,41 @@
+from models import db
+
+class DocumentChunk(db.Model):
+    __tablename__ = 'document_chunks'
+
+    id = db.Column(db.Integer, primary_key=True)
+    document_id = db.Column(db.Integer, db.ForeignKey('documents.id', ondelete='CASCADE'), nullable=False, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False, index=True)
+    position = db.Column(db.Integer, nullable=False)  # 0 = descripción, 1..n = texto del archivo
+    text = db.Column(db.Text, nullable=False)
+    length = db.Column(db.Integer, nullable=False)  # número de términos
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'document_id': self.document_id,
+            'position': self.position,
+            'text': self.text,
+            'length': self.length
+        }
+
+class ChunkPosting(db.Model):
+    __tablename__ = 'chunk_postings'
+    __table_args__ = (
+        db.Index('ix_chunk_postings_user_term_tf', 'user_id', 'term', 'tf'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False)
+    term = db.Column(db.String(64), nullable=False)
+    chunk_id = db.Column(db.Integer, db.ForeignKey('document_chunks.id', ondelete='CASCADE'), nullable=False, index=True)
+    tf = db.Column(db.Integer, nullable=False)
+    length = db.Column(db.Integer, nullable=False)  # copia de DocumentChunk.length para evitar el join
+
+class IndexStats(db.Model):
+    __tablename__ = 'index_stats'
+
+    # Totales por usuario que BM25 necesita (N y longitud media)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    chunk_count = db.Column(db.Integer, nullable=False, default=0)
+    total_length = db.Column(db.Integer, nullable=False, default=0)
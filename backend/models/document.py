@@ -1,9 +1,15 @@
 from datetime import datetime
+import secrets
+
 from models import db
 
 class Document(db.Model):
     __tablename__ = 'documents'
-    __table_args__ = {'extend_existing': True}
+    __table_args__ = (
+        # Paginación por cursor del listado: WHERE user_id = ? ORDER BY upload_date, id
+        db.Index('ix_documents_user_upload_date_id', 'user_id', 'upload_date', 'id'),
+        {'extend_existing': True}
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     filename = db.Column(db.String(255), nullable=False)
@@ -15,10 +21,26 @@ class Document(db.Model):
     last_modified = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     is_public = db.Column(db.Boolean, default=False)
     description = db.Column(db.Text)
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, processing, ready, failed
+    mime_type = db.Column(db.String(100))
+    checksum = db.Column(db.String(64))  # sha256
+    share_token = db.Column(db.String(64), unique=True, index=True)  # enlace público opaco
+    archive_entry_count = db.Column(db.Integer)  # None = contenido del zip/7z/rar aún sin indexar
     
     # Relaciones
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
 
+    @staticmethod
+    def share_token_for(is_public, current_token):
+        # Al dejar de ser público el token se borra: los enlaces antiguos dejan de funcionar
+        if not is_public:
+            return None
+        return current_token or secrets.token_urlsafe(24)
+
+    def set_public(self, is_public):
+        self.is_public = is_public
+        self.share_token = self.share_token_for(is_public, self.share_token)
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -26,9 +48,12 @@ class Document(db.Model):
             'original_filename': self.original_filename,
             'file_type': self.file_type,
             'file_size': self.file_size,
-            'upload_date': self.upload_date.isoformat(),
-            'last_modified': self.last_modified.isoformat(),
+            'upload_date': self.upload_date,
+            'last_modified': self.last_modified,
             'is_public': self.is_public,
+            'share_token': self.share_token,
             'description': self.description,
+            'status': self.status,
+            'mime_type': self.mime_type,
             'user_id': self.user_id
         } 
\ No newline at end of file
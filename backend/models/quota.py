@@ -0,0 +1,12 @@
+from datetime import datetime
+from models import db
+
+class StorageUsage(db.Model):
+    __tablename__ = 'storage_usage'
+
+    # Contador de espacio por usuario: se actualiza en la misma transacción
+    # que crea o borra documentos y se reconcilia periódicamente
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    bytes_used = db.Column(db.BigInteger, nullable=False, default=0)
+    document_count = db.Column(db.Integer, nullable=False, default=0)
+    reconciled_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -0,0 +1,15 @@
+from datetime import datetime
+from models import db
+
+class RevokedToken(db.Model):
+    __tablename__ = 'revoked_tokens'
+
+    # Fila por JWT revocado (jti) o, con jti NULL, cierre de todas las sesiones
+    # del usuario: se rechazan sus tokens con versión menor que session_version.
+    # Cada proceso sincroniza por revoked_at las filas nuevas.
+    id = db.Column(db.Integer, primary_key=True)
+    jti = db.Column(db.String(64), unique=True)
+    user_id = db.Column(db.Integer, nullable=False, index=True)
+    session_version = db.Column(db.Integer)
+    revoked_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)  # después ya no hace falta guardarla
@@ -0,0 +1,12 @@
+from datetime import datetime
+from models import db
+
+class StoredFile(db.Model):
+    __tablename__ = 'stored_files'
+
+    # Un archivo físico por contenido; los Document lo referencian por checksum
+    digest = db.Column(db.String(64), primary_key=True)  # sha256
+    file_path = db.Column(db.String(512), nullable=False)
+    size = db.Column(db.BigInteger, nullable=False)
+    ref_count = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
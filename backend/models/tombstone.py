@@ -0,0 +1,10 @@
+from datetime import datetime
+from models import db
+
+class FileTombstone(db.Model):
+    __tablename__ = 'file_tombstones'
+
+    # Archivo que ya no referencia ninguna fila y que el barrendero debe borrar
+    id = db.Column(db.Integer, primary_key=True)
+    file_path = db.Column(db.String(512), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
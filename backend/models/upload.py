@@ -0,0 +1,26 @@
+from datetime import datetime
+from models import db
+
+class UploadSession(db.Model):
+    __tablename__ = 'upload_sessions'
+
+    id = db.Column(db.String(36), primary_key=True)  # uuid4
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False, index=True)
+    original_filename = db.Column(db.String(255), nullable=False)
+    file_type = db.Column(db.String(50), nullable=False)
+    file_path = db.Column(db.String(512), nullable=False)  # archivo .part en el directorio final
+    total_size = db.Column(db.Integer, nullable=False)
+    received = db.Column(db.Integer, nullable=False, default=0)
+    description = db.Column(db.Text)
+    is_public = db.Column(db.Boolean, default=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+    def to_dict(self):
+        return {
+            'upload_id': self.id,
+            'original_filename': self.original_filename,
+            'total_size': self.total_size,
+            'offset': self.received,
+            'expires_at': self.expires_at
+        }
@@ -1,9 +1,9 @@
 from flask_sqlalchemy import SQLAlchemy
-from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
 import uuid
 
 from models import db
+from services import passwords
 
 class User(db.Model):
     __tablename__ = 'users'
@@ -15,16 +15,27 @@ class User(db.Model):
     last_name = db.Column(db.String(100), nullable=False)
     is_active = db.Column(db.Boolean(), nullable=False, default=True)
     profile_picture = db.Column(db.String(255))
+    avatar_hash = db.Column(db.String(16))  # prefijo del sha256 del original; versiona la URL del avatar
+    session_version = db.Column(db.Integer, nullable=False, default=0)  # sube con cada cierre de todas las sesiones
     bio = db.Column(db.Text)
     is_verified = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    # El hash se calcula en el pool acotado de services.passwords
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = passwords.hash_password(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return passwords.check_password(self.password_hash, password)
+
+    def password_needs_rehash(self):
+        return passwords.needs_rehash(self.password_hash)
+
+    def avatar_url(self):
+        if not self.avatar_hash:
+            return None
+        return f'/api/users/{self.id}/avatar/{self.avatar_hash}'
 
     def to_dict(self):
         return {
@@ -34,10 +45,11 @@ class User(db.Model):
             'first_name': self.first_name,
             'last_name': self.last_name,
             'profile_picture': self.profile_picture,
+            'avatar_url': self.avatar_url(),
             'bio': self.bio,
             'is_verified': self.is_verified,
-            'created_at': self.created_at.isoformat(),
-            'updated_at': self.updated_at.isoformat()
+            'created_at': self.created_at,
+            'updated_at': self.updated_at
         }
 
 class Role(db.Model):
@@ -1,7 +1,8 @@
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import create_access_token, create_refresh_token, jwt_required, get_jwt_identity
+from flask_jwt_extended import create_access_token, create_refresh_token, jwt_required, current_user, get_jwt, decode_token
 from models.user import db, User
 from errors import APIError
+from services import revocation
 from datetime import timedelta
 
 auth_bp = Blueprint('auth', __name__)
@@ -38,11 +39,13 @@ def register():
         # Crear tokens de acceso y refresco
         access_token = create_access_token(
             identity=user.id,
-            expires_delta=timedelta(days=1)
+            expires_delta=timedelta(days=1),
+            additional_claims=revocation.token_claims(user.session_version)
         )
         refresh_token = create_refresh_token(
             identity=user.id,
-            expires_delta=timedelta(days=30)
+            expires_delta=timedelta(days=30),
+            additional_claims=revocation.token_claims(user.session_version)
         )
         
         return jsonify({
@@ -72,14 +75,21 @@ def login():
         
         if not user or not user.check_password(data['password']):
             raise APIError('Credenciales inválidas', 401)
+
+        # Actualizar en silencio los hashes creados con parámetros antiguos
+        if user.password_needs_rehash():
+            user.set_password(data['password'])
+            db.session.commit()
         
         access_token = create_access_token(
             identity=user.id,
-            expires_delta=timedelta(days=1)
+            expires_delta=timedelta(days=1),
+            additional_claims=revocation.token_claims(user.session_version)
         )
         refresh_token = create_refresh_token(
             identity=user.id,
-            expires_delta=timedelta(days=30)
+            expires_delta=timedelta(days=30),
+            additional_claims=revocation.token_claims(user.session_version)
         )
         
         return jsonify({
@@ -99,15 +109,12 @@ def login():
 @jwt_required(refresh=True)
 def refresh():
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
-        
-        if not user:
-            raise APIError('Usuario no encontrado', 404)
-            
+        # current_user lo resuelve el loader de services.identity (404 si no existe)
         access_token = create_access_token(
-            identity=user.id,
-            expires_delta=timedelta(days=1)
+            identity=current_user.id,
+            expires_delta=timedelta(days=1),
+            # La versión de sesión del refresh sigue vigente: si no, estaría revocado
+            additional_claims=revocation.token_claims(get_jwt().get('sv'))
         )
         
         return jsonify({
@@ -124,18 +131,58 @@ def refresh():
 @jwt_required()
 def get_current_user():
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
-        
-        if not user:
-            raise APIError('Usuario no encontrado', 404)
-            
         return jsonify({
             'status': 'success',
-            'user': user.to_dict()
+            'user': current_user.to_dict()
         })
         
     except APIError as e:
         raise e
     except Exception as e:
-        raise APIError('Error al obtener información del usuario', 500) 
\ No newline at end of file
+        raise APIError('Error al obtener información del usuario', 500) 
+
+@auth_bp.route('/logout', methods=['POST'])
+@jwt_required(verify_type=False)
+def logout():
+    try:
+        # Revoca el token presentado y, si se envía, también el de refresco
+        token = get_jwt()
+        revocation.revoke(token)
+
+        data = request.get_json(silent=True) or {}
+        if data.get('refresh_token'):
+            try:
+                refresh_token = decode_token(data['refresh_token'], allow_expired=True)
+            except Exception:
+                raise APIError('Token de refresco inválido', 400)
+            if str(refresh_token['sub']) != str(token['sub']):
+                raise APIError('Token de refresco inválido', 400)
+            revocation.revoke(refresh_token)
+
+        db.session.commit()
+        return jsonify({
+            'status': 'success',
+            'message': 'Sesión cerrada'
+        })
+
+    except APIError as e:
+        raise e
+    except Exception as e:
+        raise APIError('Error al cerrar sesión', 500)
+
+@auth_bp.route('/logout-all', methods=['POST'])
+@jwt_required(verify_type=False)
+def logout_all():
+    try:
+        # Cierra todas las sesiones del usuario, incluida esta
+        revocation.revoke_user(current_user.id)
+        db.session.commit()
+        return jsonify({
+            'status': 'success',
+            'message': 'Se han cerrado todas las sesiones'
+        })
+
+    except APIError as e:
+        raise e
+    except Exception as e:
+        raise APIError('Error al cerrar las sesiones', 500)
@@ -1,8 +1,14 @@
-from flask import Blueprint, request, jsonify, send_file
+from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from werkzeug.utils import secure_filename
 from models.document import Document
+from models.job import ProcessingJob
+from models.upload import UploadSession
 from models.user import db
+from services import retrieval, jobs, uploads, storage, downloads, serialization, search, public_files, archives, quota
+from datetime import datetime
+import base64
+import json
 import os
 import uuid
 
@@ -40,6 +46,27 @@ ALLOWED_EXTENSIONS = {
     '7z': 20 * 1024 * 1024,   # 20MB
 }
 
+# Listado paginado: campos que se pueden pedir con fields= y su columna
+LIST_FIELDS = {
+    'id': Document.id,
+    'filename': Document.filename,
+    'original_filename': Document.original_filename,
+    'file_type': Document.file_type,
+    'file_size': Document.file_size,
+    'upload_date': Document.upload_date,
+    'last_modified': Document.last_modified,
+    'is_public': Document.is_public,
+    'share_token': Document.share_token,
+    'description': Document.description,
+    'status': Document.status,
+    'mime_type': Document.mime_type,
+    'user_id': Document.user_id,
+}
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+# Operaciones por petición en /batch
+MAX_BATCH_OPERATIONS = 1000
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
@@ -47,6 +74,25 @@ def get_max_size(filename):
     ext = filename.rsplit('.', 1)[1].lower()
     return ALLOWED_EXTENSIONS.get(ext, 0)
 
+def encode_cursor(upload_date, document_id):
+    raw = json.dumps([upload_date.isoformat(), document_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    padded = cursor + '=' * (-len(cursor) % 4)
+    upload_date, document_id = json.loads(base64.urlsafe_b64decode(padded))
+    return datetime.fromisoformat(upload_date), int(document_id)
+
+def wake_jobs():
+    runner = current_app.extensions.get('document_jobs')
+    if runner:
+        runner.wake()
+
+def wake_sweeper():
+    sweeper = current_app.extensions.get('file_sweeper')
+    if sweeper:
+        sweeper.wake()
+
 @documents_bp.route('/upload', methods=['POST'])
 @jwt_required()
 def upload_document():
@@ -75,40 +121,278 @@ def upload_document():
     description = request.form.get('description', '')
     is_public = request.form.get('is_public', 'false').lower() == 'true'
 
-    # Generar nombre único para el archivo
     original_filename = secure_filename(file.filename)
     file_ext = original_filename.rsplit('.', 1)[1].lower()
-    unique_filename = f"{uuid.uuid4()}.{file_ext}"
-    
-    # Crear directorio si no existe
-    upload_dir = os.path.join('uploads', 'documents', str(user_id))
-    os.makedirs(upload_dir, exist_ok=True)
-    
-    file_path = os.path.join(upload_dir, unique_filename)
-    file.save(file_path)
+
+    # Guardar por contenido: el hash se calcula mientras se copia el archivo
+    # y un contenido ya almacenado solo suma una referencia
+    tmp_path, checksum, file_size = storage.save_stream(file.stream)
+
+    # La reserva bloquea la fila de uso del usuario hasta el commit: se hace
+    # con el archivo ya copiado para no retenerla durante la escritura en disco.
+    # Se deshace con la transacción si la subida falla.
+    if not quota.reserve(user_id, file_size):
+        os.remove(tmp_path)
+        return jsonify({'error': 'Se ha superado la cuota de almacenamiento'}), 413
+    file_path = storage.store(tmp_path, checksum, file_size)
 
     document = Document(
-        filename=unique_filename,
+        filename=f"{checksum}.{file_ext}",
         original_filename=original_filename,
         file_path=file_path,
         file_type=file_ext,
         file_size=file_size,
+        checksum=checksum,
         description=description,
-        is_public=is_public,
         user_id=user_id
     )
+    document.set_public(is_public)
 
     db.session.add(document)
+    db.session.flush()
+
+    # Tipo MIME, hash e indexado se hacen en segundo plano
+    jobs.enqueue(document)
     db.session.commit()
+    wake_jobs()
 
     return jsonify(document.to_dict()), 201
 
+# Subida por trozos reanudable: init -> PUT con Upload-Offset -> complete
+@documents_bp.route('/uploads', methods=['POST'])
+@jwt_required()
+def init_upload():
+    data = request.get_json() or {}
+    filename = data.get('filename', '')
+    total_size = data.get('size')
+
+    if not filename:
+        return jsonify({'error': 'No se proporcionó el nombre del archivo'}), 400
+
+    if not allowed_file(filename):
+        return jsonify({'error': 'Tipo de archivo no permitido'}), 400
+
+    if not isinstance(total_size, int) or total_size <= 0:
+        return jsonify({'error': 'Tamaño de archivo inválido'}), 400
+
+    # JSON: se exige un booleano; bool("false") publicaría el documento
+    is_public = data.get('is_public', False)
+    if not isinstance(is_public, bool):
+        return jsonify({'error': 'is_public debe ser un booleano'}), 400
+
+    max_size = get_max_size(filename)
+    if total_size > max_size:
+        return jsonify({
+            'error': f'El archivo excede el tamaño máximo permitido de {max_size / (1024 * 1024)}MB'
+        }), 400
+
+    user_id = get_jwt_identity()
+    if not quota.fits(user_id, total_size):
+        return jsonify({'error': 'Se ha superado la cuota de almacenamiento'}), 413
+
+    original_filename = secure_filename(filename)
+    file_ext = filename.rsplit('.', 1)[1].lower()
+    upload_id = str(uuid.uuid4())
+
+    upload_dir = os.path.join('uploads', 'documents', str(user_id))
+    os.makedirs(upload_dir, exist_ok=True)
+
+    uploads.purge_expired(user_id)
+    session = uploads.new_session(
+        session_id=upload_id,
+        user_id=user_id,
+        original_filename=original_filename,
+        file_type=file_ext,
+        file_path=os.path.join(upload_dir, f"{upload_id}.{file_ext}.part"),
+        total_size=total_size,
+        description=data.get('description', ''),
+        is_public=is_public
+    )
+    db.session.add(session)
+    db.session.commit()
+
+    response = session.to_dict()
+    response['chunk_size'] = uploads.CHUNK_SIZE
+    return jsonify(response), 201
+
+@documents_bp.route('/uploads/<upload_id>', methods=['GET'])
+@jwt_required()
+def get_upload(upload_id):
+    user_id = get_jwt_identity()
+    session = UploadSession.query.filter_by(id=upload_id, user_id=user_id).first_or_404()
+    return jsonify(session.to_dict())
+
+@documents_bp.route('/uploads/<upload_id>', methods=['PUT'])
+@jwt_required()
+def append_upload_chunk(upload_id):
+    user_id = get_jwt_identity()
+    session = UploadSession.query.filter_by(id=upload_id, user_id=user_id).first_or_404()
+
+    offset = request.headers.get('Upload-Offset', type=int)
+    if offset is None:
+        return jsonify({'error': 'Se requiere la cabecera Upload-Offset'}), 400
+
+    if offset != session.received:
+        return jsonify({'error': 'Offset incorrecto', 'offset': session.received}), 409
+
+    # El cuerpo es el trozo en bruto: se lee del stream sin multipart
+    written = uploads.write_chunk(session, offset, request.stream)
+    if not uploads.advance(session, offset, written):
+        db.session.rollback()
+        session = UploadSession.query.filter_by(id=upload_id, user_id=user_id).first_or_404()
+        return jsonify({'error': 'Offset incorrecto', 'offset': session.received}), 409
+    db.session.commit()
+
+    return jsonify({'upload_id': upload_id, 'offset': offset + written, 'total_size': session.total_size})
+
+@documents_bp.route('/uploads/<upload_id>/complete', methods=['POST'])
+@jwt_required()
+def complete_upload(upload_id):
+    user_id = get_jwt_identity()
+    session = UploadSession.query.filter_by(id=upload_id, user_id=user_id).first_or_404()
+
+    if session.received != session.total_size:
+        return jsonify({'error': 'La subida no está completa', 'offset': session.received}), 409
+
+    # Un trozo interrumpido puede haber dejado bytes de más tras el final
+    with open(session.file_path, 'r+b') as f:
+        f.truncate(session.total_size)
+    checksum = storage.finish_chunks(session.id, session.file_path, session.total_size)
+
+    # Reserva tras el hash, como en upload_document; si no cabe, la sesión
+    # sigue ahí para completarla tras liberar espacio
+    if not quota.reserve(user_id, session.total_size):
+        return jsonify({'error': 'Se ha superado la cuota de almacenamiento'}), 413
+    file_path = storage.store(session.file_path, checksum, session.total_size)
+
+    document = Document(
+        filename=f"{checksum}.{session.file_type}",
+        original_filename=session.original_filename,
+        file_path=file_path,
+        file_type=session.file_type,
+        file_size=session.total_size,
+        checksum=checksum,
+        description=session.description,
+        user_id=user_id
+    )
+    document.set_public(session.is_public)
+
+    db.session.add(document)
+    db.session.delete(session)
+    db.session.flush()
+
+    jobs.enqueue(document)
+    db.session.commit()
+    wake_jobs()
+
+    return jsonify(document.to_dict()), 201
+
+@documents_bp.route('/uploads/<upload_id>', methods=['DELETE'])
+@jwt_required()
+def abort_upload(upload_id):
+    user_id = get_jwt_identity()
+    session = UploadSession.query.filter_by(id=upload_id, user_id=user_id).first_or_404()
+    uploads.discard(session)
+    db.session.commit()
+    return '', 204
+
 @documents_bp.route('/', methods=['GET'])
 @jwt_required()
 def get_documents():
     user_id = get_jwt_identity()
-    documents = Document.query.filter_by(user_id=user_id).all()
-    return jsonify([doc.to_dict() for doc in documents])
+    args = request.args
+
+    filters = [Document.user_id == user_id]
+    if 'file_type' in args:
+        filters.append(Document.file_type == args['file_type'].lower())
+    if 'is_public' in args:
+        filters.append(Document.is_public == (args['is_public'].lower() == 'true'))
+
+    # Sin parámetros de paginación se mantiene la respuesta original (lista
+    # completa), pero en streaming desde un cursor del servidor
+    if not any(key in args for key in ('limit', 'cursor', 'fields')):
+        result = db.session.execute(
+            db.select(*[column.label(field) for field, column in LIST_FIELDS.items()])
+            .where(*filters)
+            .execution_options(yield_per=serialization.STREAM_BATCH_ROWS)
+        )
+        return serialization.stream_array(current_app, (dict(row._mapping) for row in result))
+
+    limit = args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+    if limit < 1 or limit > MAX_PAGE_SIZE:
+        return jsonify({'error': f'limit debe estar entre 1 y {MAX_PAGE_SIZE}'}), 400
+
+    fields = [field for field in args.get('fields', '').split(',') if field] or list(LIST_FIELDS)
+    unknown = [field for field in fields if field not in LIST_FIELDS]
+    if unknown:
+        return jsonify({'error': f'Campos no válidos: {", ".join(unknown)}'}), 400
+
+    if 'cursor' in args:
+        try:
+            cursor_date, cursor_id = decode_cursor(args['cursor'])
+        except (ValueError, TypeError):
+            return jsonify({'error': 'Cursor inválido'}), 400
+        filters.append(db.tuple_(Document.upload_date, Document.id) < (cursor_date, cursor_id))
+
+    # Solo se leen las columnas pedidas (más las del cursor), sin objetos ORM
+    columns = [LIST_FIELDS[field].label(field) for field in fields]
+    columns += [Document.upload_date.label('_cursor_date'), Document.id.label('_cursor_id')]
+    rows = db.session.execute(
+        db.select(*columns)
+        .where(*filters)
+        .order_by(Document.upload_date.desc(), Document.id.desc())
+        .limit(limit + 1)
+    ).all()
+
+    items = [{field: row._mapping[field] for field in fields} for row in rows[:limit]]
+
+    next_cursor = None
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        next_cursor = encode_cursor(last._cursor_date, last._cursor_id)
+
+    return jsonify({'items': items, 'next_cursor': next_cursor})
+
+@documents_bp.route('/search', methods=['GET'])
+@jwt_required()
+def search_documents():
+    user_id = get_jwt_identity()
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'Se requiere el parámetro q'}), 400
+
+    page = request.args.get('page', 1, type=int)
+    per_page = request.args.get('per_page', 20, type=int)
+    if page < 1 or per_page < 1 or per_page > MAX_PAGE_SIZE:
+        return jsonify({'error': f'page debe ser >= 1 y per_page estar entre 1 y {MAX_PAGE_SIZE}'}), 400
+
+    rows = search.search_documents(
+        user_id,
+        query,
+        columns=[column.label(field) for field, column in LIST_FIELDS.items()],
+        limit=per_page,
+        offset=(page - 1) * per_page
+    )
+    return jsonify({
+        'items': [dict(row._mapping) for row in rows],
+        'page': page,
+        'per_page': per_page
+    })
+
+@documents_bp.route('/retrieve', methods=['GET'])
+@jwt_required()
+def retrieve_chunks():
+    user_id = get_jwt_identity()
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'Se requiere el parámetro q'}), 400
+
+    k = request.args.get('k', 5, type=int)
+    max_tokens = request.args.get('max_tokens', type=int)
+    if k < 1 or k > 50:
+        return jsonify({'error': 'k debe estar entre 1 y 50'}), 400
+
+    return jsonify(retrieval.search(user_id, query, k=k, max_tokens=max_tokens))
 
 @documents_bp.route('/<int:document_id>', methods=['GET'])
 @jwt_required()
@@ -126,10 +410,14 @@ def update_document(document_id):
     data = request.get_json()
     if 'description' in data:
         document.description = data['description']
+        retrieval.index_description(document)
+    previous_token = document.share_token
     if 'is_public' in data:
-        document.is_public = data['is_public']
+        document.set_public(bool(data['is_public']))
     
     db.session.commit()
+    if document.share_token != previous_token:
+        public_files.invalidate(previous_token)
     return jsonify(document.to_dict())
 
 @documents_bp.route('/<int:document_id>', methods=['DELETE'])
@@ -138,14 +426,131 @@ def delete_document(document_id):
     user_id = get_jwt_identity()
     document = Document.query.filter_by(id=document_id, user_id=user_id).first_or_404()
     
-    # Eliminar archivo físico
-    if os.path.exists(document.file_path):
-        os.remove(document.file_path)
-    
+    # El archivo físico solo se borra al quitar la última referencia, y lo
+    # borra el barrendero a partir de file_tombstones
+    storage.release_document(document)
+    retrieval.remove_document(document)
+    archives.remove_entries([document.id])
+    quota.release(user_id, document.file_size)
+    share_token = document.share_token
     db.session.delete(document)
     db.session.commit()
+    public_files.invalidate(share_token)
+    wake_sweeper()
     return '', 204
 
+def parse_batch_operation(operation, seen):
+    # Devuelve un mensaje de error o None si la operación es válida
+    if not isinstance(operation, dict) or operation.get('op') not in ('update', 'delete'):
+        return 'Operación no válida'
+    document_id = operation.get('id')
+    if not isinstance(document_id, int) or isinstance(document_id, bool):
+        return 'Se requiere el id del documento'
+    if document_id in seen:
+        return 'Documento repetido en el lote'
+    if operation['op'] == 'update':
+        if 'description' not in operation and 'is_public' not in operation:
+            return 'No hay campos que actualizar'
+        description = operation.get('description')
+        if description is not None and not isinstance(description, str):
+            return 'Descripción no válida'
+        if 'is_public' in operation and not isinstance(operation['is_public'], bool):
+            return 'is_public debe ser un booleano'
+    return None
+
+# Varias operaciones en una sola transacción: una consulta para comprobar la
+# propiedad, un UPDATE por lotes y borrados por conjuntos
+@documents_bp.route('/batch', methods=['POST'])
+@jwt_required()
+def batch_documents():
+    user_id = get_jwt_identity()
+    data = request.get_json(silent=True) or {}
+    operations = data.get('operations')
+    if not isinstance(operations, list) or not operations:
+        return jsonify({'error': 'Se requiere una lista de operaciones'}), 400
+    if len(operations) > MAX_BATCH_OPERATIONS:
+        return jsonify({'error': f'Máximo {MAX_BATCH_OPERATIONS} operaciones por lote'}), 400
+
+    results = [None] * len(operations)
+    valid = {}
+    for index, operation in enumerate(operations):
+        error = parse_batch_operation(operation, valid)
+        if error:
+            results[index] = {'id': operation.get('id') if isinstance(operation, dict) else None,
+                              'status': 'invalid', 'error': error}
+        else:
+            valid[operation['id']] = index
+
+    current = {
+        row.id: row
+        for row in db.session.execute(
+            db.select(Document.id, Document.description, Document.share_token, Document.file_size)
+            .where(Document.user_id == user_id, Document.id.in_(list(valid)))
+        )
+    }
+
+    now = datetime.utcnow()
+    updates = []
+    descriptions = {}
+    delete_ids = []
+    freed_bytes = 0
+    stale_tokens = []
+    for document_id, index in valid.items():
+        operation = operations[index]
+        row = current.get(document_id)
+        if row is None:
+            results[index] = {'id': document_id, 'status': 'not_found'}
+            continue
+
+        if operation['op'] == 'delete':
+            delete_ids.append(document_id)
+            freed_bytes += row.file_size
+            stale_tokens.append(row.share_token)
+            results[index] = {'id': document_id, 'status': 'deleted'}
+            continue
+
+        values = {'id': document_id, 'last_modified': now}
+        if 'description' in operation and operation['description'] != row.description:
+            values['description'] = operation['description']
+            descriptions[document_id] = operation['description']
+        if 'is_public' in operation:
+            is_public = operation['is_public']
+            values['is_public'] = is_public
+            values['share_token'] = Document.share_token_for(is_public, row.share_token)
+            if values['share_token'] != row.share_token:
+                stale_tokens.append(row.share_token)
+        updates.append(values)
+        results[index] = {'id': document_id, 'status': 'updated', 'share_token': values.get('share_token', row.share_token)}
+
+    if updates:
+        # UPDATE por clave primaria: SQLAlchemy agrupa las filas por columnas en executemany
+        db.session.execute(db.update(Document), updates)
+    if descriptions:
+        retrieval.index_descriptions(user_id, descriptions)
+    if delete_ids:
+        # Los archivos sin referencias quedan en file_tombstones para el barrendero
+        storage.release_documents(Document.user_id == user_id, Document.id.in_(delete_ids))
+        retrieval.remove_documents(user_id, delete_ids)
+        archives.remove_entries(delete_ids)
+        quota.release(user_id, freed_bytes, len(delete_ids))
+        db.session.execute(
+            db.delete(ProcessingJob)
+            .where(ProcessingJob.document_id.in_(delete_ids))
+            .execution_options(synchronize_session=False)
+        )
+        db.session.execute(
+            db.delete(Document)
+            .where(Document.user_id == user_id, Document.id.in_(delete_ids))
+            .execution_options(synchronize_session=False)
+        )
+    db.session.commit()
+
+    for token in stale_tokens:
+        public_files.invalidate(token)
+    if delete_ids:
+        wake_sweeper()
+    return jsonify({'results': results})
+
 @documents_bp.route('/<int:document_id>/download', methods=['GET'])
 @jwt_required()
 def download_document(document_id):
@@ -155,8 +560,41 @@ def download_document(document_id):
     if not os.path.exists(document.file_path):
         return jsonify({'error': 'Archivo no encontrado'}), 404
     
-    return send_file(
-        document.file_path,
-        as_attachment=True,
-        download_name=document.original_filename
-    ) 
\ No newline at end of file
+    return downloads.send_document(document)
+
+# Contenido de zip/7z/rar sin descargar el archivo entero
+@documents_bp.route('/<int:document_id>/archive', methods=['GET'])
+@jwt_required()
+def list_archive(document_id):
+    user_id = get_jwt_identity()
+    document = Document.query.filter_by(id=document_id, user_id=user_id).first_or_404()
+    if document.file_type not in archives.ARCHIVE_TYPES:
+        return jsonify({'error': 'El documento no es un archivo comprimido'}), 400
+    if not os.path.exists(document.file_path):
+        return jsonify({'error': 'Archivo no encontrado'}), 404
+
+    entries = archives.list_entries(document)
+    db.session.commit()
+    return jsonify({'document_id': document.id, 'entries': [entry.to_dict() for entry in entries]})
+
+@documents_bp.route('/<int:document_id>/archive/<int:position>', methods=['GET'])
+@jwt_required()
+def download_archive_entry(document_id, position):
+    user_id = get_jwt_identity()
+    document = Document.query.filter_by(id=document_id, user_id=user_id).first_or_404()
+    if document.file_type not in archives.ARCHIVE_TYPES:
+        return jsonify({'error': 'El documento no es un archivo comprimido'}), 400
+    if not os.path.exists(document.file_path):
+        return jsonify({'error': 'Archivo no encontrado'}), 404
+
+    response = archives.send_member(document, position)
+    db.session.commit()
+    return response
+
+# Documentos públicos: sin JWT, solo por token opaco
+@documents_bp.route('/shared/<token>', methods=['GET'])
+def get_shared_document(token):
+    entry = public_files.lookup(token)
+    if entry is None:
+        return jsonify({'error': 'Documento no encontrado'}), 404
+    return public_files.send(entry)
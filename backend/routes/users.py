@@ -1,25 +1,26 @@
-from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask import Blueprint, request, jsonify, current_app, redirect, send_file
+from flask_jwt_extended import jwt_required, current_user
 from models.user import User, db
+from services import accounts, avatars, identity, public_files, quota, storage
 import os
 from werkzeug.utils import secure_filename
 
 users_bp = Blueprint('users', __name__)
 
+AVATAR_MAX_AGE = 365 * 24 * 3600  # la URL cambia con el contenido
+
 @users_bp.route('/profile', methods=['GET'])
 @jwt_required()
 def get_profile():
-    user_id = get_jwt_identity()
-    user = User.query.get(user_id)
-    if not user:
-        return jsonify({'error': 'Usuario no encontrado'}), 404
-    return jsonify(user.to_dict())
+    profile = current_user.to_dict()
+    profile['storage'] = quota.usage(current_user.id)
+    return jsonify(profile)
 
 @users_bp.route('/profile', methods=['PUT'])
 @jwt_required()
 def update_profile():
-    user_id = get_jwt_identity()
-    user = User.query.get(user_id)
+    user_id = current_user.id
+    user = identity.get_user(user_id)
     if not user:
         return jsonify({'error': 'Usuario no encontrado'}), 404
 
@@ -36,13 +37,14 @@ def update_profile():
         user.bio = data['bio']
 
     db.session.commit()
+    identity.invalidate(user_id)
     return jsonify(user.to_dict())
 
 @users_bp.route('/profile/picture', methods=['POST'])
 @jwt_required()
 def update_profile_picture():
-    user_id = get_jwt_identity()
-    user = User.query.get(user_id)
+    user_id = current_user.id
+    user = identity.get_user(user_id)
     if not user:
         return jsonify({'error': 'Usuario no encontrado'}), 404
 
@@ -55,46 +57,80 @@ def update_profile_picture():
 
     if file:
         filename = secure_filename(file.filename)
-        # Generar un nombre único para el archivo
-        unique_filename = f"{user_id}_{filename}"
-        file_path = os.path.join('uploads', 'profile_pictures', unique_filename)
+        file_ext = filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
+        if file_ext not in avatars.ALLOWED_EXTENSIONS:
+            return jsonify({'error': 'Formato de imagen no permitido'}), 400
+
+        # El hash del contenido versiona la URL y el directorio de las variantes
+        tmp_path, digest, _ = storage.save_stream(file.stream)
+        if not avatars.valid_image(tmp_path, file_ext):
+            os.remove(tmp_path)
+            return jsonify({'error': 'El archivo no es una imagen válida'}), 400
+        avatar_hash = digest[:avatars.HASH_LENGTH]
+        file_path = os.path.join(avatars.avatar_dir(user_id, avatar_hash), f"original.{file_ext}")
         
         # Asegurar que el directorio existe
         os.makedirs(os.path.dirname(file_path), exist_ok=True)
-        
-        file.save(file_path)
+        os.replace(tmp_path, file_path)
+
+        if user.avatar_hash != avatar_hash:
+            avatars.retire(user_id, user.profile_picture, user.avatar_hash)
         user.profile_picture = file_path
+        user.avatar_hash = avatar_hash
         db.session.commit()
+        identity.invalidate(user_id)
+
+        # Las variantes 64/128/512 se generan fuera del hilo de la petición
+        avatars.schedule(file_path, user_id, avatar_hash)
         
         return jsonify({
             'message': 'Imagen de perfil actualizada',
-            'profile_picture': file_path
+            'profile_picture': file_path,
+            'avatar_url': user.avatar_url()
         })
 
+@users_bp.route('/<int:user_id>/avatar/<avatar_hash>', methods=['GET'])
+def get_avatar(user_id, avatar_hash):
+    if not avatars.valid_hash(avatar_hash):
+        return jsonify({'error': 'Imagen no encontrada'}), 404
+
+    size = avatars.pick_size(request.args.get('size', avatars.DEFAULT_SIZE, type=int))
+    file_path = avatars.variant_path(user_id, avatar_hash, size)
+
+    # Camino rápido: la variante existe y la URL está versionada, sin consultar la BD
+    if not os.path.exists(file_path):
+        user = db.session.get(User, user_id)
+        if not user or not user.avatar_hash:
+            return jsonify({'error': 'Imagen no encontrada'}), 404
+        if user.avatar_hash != avatar_hash:
+            return redirect(f"{user.avatar_url()}?size={size}")
+        # Aún no generada (o sin Pillow): se genera ahora o se sirve el original
+        file_path = avatars.render_variant(user.profile_picture, user_id, avatar_hash, size) or user.profile_picture
+
+    response = send_file(
+        os.path.abspath(file_path),
+        etag=f"{avatar_hash}-{size}",
+        max_age=AVATAR_MAX_AGE,
+        conditional=True
+    )
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
 @users_bp.route('/profile', methods=['DELETE'])
 @jwt_required()
 def delete_profile():
-    user_id = get_jwt_identity()
-    user = User.query.get(user_id)
-    if not user:
-        return jsonify({'error': 'Usuario no encontrado'}), 404
+    user_id = current_user.id
 
-    # Eliminar archivos asociados
-    if user.profile_picture:
-        try:
-            os.remove(user.profile_picture)
-        except:
-            pass  # Ignorar errores al eliminar archivos
-
-    # Eliminar documentos
-    for doc in user.documents:
-        try:
-            os.remove(doc.file_path)
-        except:
-            pass
-        db.session.delete(doc)
-
-    db.session.delete(user)
+    # Borrado por conjuntos en una sola transacción; los archivos los borra
+    # el barrendero en segundo plano a partir de file_tombstones
+    accounts.delete_account(user_id)
     db.session.commit()
+    identity.invalidate(user_id)
+    public_files.invalidate_user(user_id)
+
+    sweeper = current_app.extensions.get('file_sweeper')
+    if sweeper:
+        sweeper.wake()
     
-    return jsonify({'message': 'Perfil eliminado correctamente'}) 
\ No newline at end of file
+    return jsonify({'message': 'Perfil eliminado correctamente'})
\ No newline at end of file
@@ -0,0 +1,39 @@
+from models import db
+from models.user import User, UserRoles
+from models.document import Document
+from models.job import ProcessingJob
+from models.upload import UploadSession
+from services import archives, avatars, quota, retrieval, storage
+
+def delete_account(user_id):
+    # Borrado por conjuntos: el número de sentencias no depende de cuántos
+    # documentos tenga el usuario. Los archivos se registran en file_tombstones
+    # y los borra el barrendero. El llamador hace el commit.
+    storage.release_documents(Document.user_id == user_id)
+
+    # Subidas por trozos a medias
+    storage.tombstone_from(db.select(UploadSession.file_path).where(UploadSession.user_id == user_id))
+    db.session.execute(db.delete(UploadSession).where(UploadSession.user_id == user_id))
+
+    user = db.session.execute(
+        db.select(User.profile_picture, User.avatar_hash).where(User.id == user_id)
+    ).first()
+    if user:
+        avatars.retire(user_id, user.profile_picture, user.avatar_hash)
+
+    retrieval.drop_user_index(user_id)
+    quota.remove_user(user_id)
+    user_document_ids = db.select(Document.id).where(Document.user_id == user_id)
+    archives.remove_entries(user_document_ids)
+    db.session.execute(
+        db.delete(ProcessingJob)
+        .where(ProcessingJob.document_id.in_(user_document_ids))
+        .execution_options(synchronize_session=False)
+    )
+    db.session.execute(
+        db.delete(Document).where(Document.user_id == user_id).execution_options(synchronize_session=False)
+    )
+    db.session.execute(db.delete(UserRoles).where(UserRoles.user_id == user_id))
+    db.session.execute(
+        db.delete(User).where(User.id == user_id).execution_options(synchronize_session=False)
+    )
@@ -0,0 +1,277 @@
+import logging
+import mimetypes
+import os
+import posixpath
+import struct
+import zipfile
+import zlib
+
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+
+from errors import APIError
+from models import db
+from models.archive import ArchiveEntry
+from models.document import Document
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_TYPES = ('zip', '7z', 'rar')
+DEFAULT_MAX_ENTRIES = 10000
+DEFAULT_MAX_RATIO = 100
+DEFAULT_MAX_MEMBER_SIZE = 512 * 1024 * 1024
+READ_SIZE = 64 * 1024
+# Por debajo de este tamaño no se mira la proporción: un texto corto muy
+# repetitivo comprime más de 100:1 sin ser una bomba
+RATIO_GRACE = 1024 * 1024
+
+LOCAL_HEADER_SIZE = 30
+LOCAL_HEADER_SIGNATURE = b'PK\x03\x04'
+
+class ArchiveLimitError(Exception):
+    pass
+
+def _damaged():
+    return APIError('El archivo comprimido está dañado', 422)
+
+def _read_zip(path):
+    # ZipFile solo lee el directorio central al abrir
+    try:
+        with zipfile.ZipFile(path) as archive:
+            infos = archive.infolist()
+    except (zipfile.BadZipFile, OSError):
+        raise _damaged()
+    return [
+        {
+            'name': info.filename,
+            'is_dir': info.is_dir(),
+            'size': info.file_size,
+            'compressed_size': info.compress_size,
+            'header_offset': info.header_offset,
+            'compress_type': info.compress_type,
+            'crc': info.CRC,
+            'encrypted': bool(info.flag_bits & 0x1),
+        }
+        for info in infos
+    ]
+
+def _read_rar(path):
+    # rarfile es opcional y para extraer necesita unrar en el sistema
+    try:
+        import rarfile
+    except ImportError:
+        raise APIError('El servidor no puede leer archivos rar', 501)
+    try:
+        with rarfile.RarFile(path) as archive:
+            infos = archive.infolist()
+    except (rarfile.Error, OSError):
+        raise _damaged()
+    return [
+        {
+            'name': info.filename,
+            'is_dir': info.is_dir(),
+            'size': info.file_size,
+            'compressed_size': info.compress_size,
+            'encrypted': info.needs_password(),
+        }
+        for info in infos
+    ]
+
+def _read_7z(path):
+    try:
+        import py7zr
+    except ImportError:
+        raise APIError('El servidor no puede leer archivos 7z', 501)
+    try:
+        with py7zr.SevenZipFile(path, mode='r') as archive:
+            encrypted = archive.needs_password()
+            infos = archive.list()
+    except (py7zr.Bad7zFile, OSError):
+        raise _damaged()
+    # En archivos sólidos el tamaño comprimido es del bloque, no de cada entrada
+    return [
+        {
+            'name': info.filename,
+            'is_dir': info.is_directory,
+            'size': info.uncompressed or 0,
+            'compressed_size': info.compressed or 0,
+            'encrypted': encrypted,
+        }
+        for info in infos
+    ]
+
+READERS = {'zip': _read_zip, 'rar': _read_rar, '7z': _read_7z}
+
+def _build_index(document):
+    reader = READERS.get(document.file_type)
+    if reader is None:
+        raise APIError('El documento no es un archivo comprimido', 400)
+
+    rows = reader(document.file_path)
+    if len(rows) > current_app.config.get('ARCHIVE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES):
+        raise APIError('El archivo comprimido tiene demasiadas entradas', 422)
+
+    try:
+        with db.session.begin_nested():
+            if rows:
+                db.session.execute(db.insert(ArchiveEntry), [
+                    dict(row, document_id=document.id, position=position)
+                    for position, row in enumerate(rows)
+                ])
+            # Sin tocar last_modified: indexar no modifica el documento
+            db.session.execute(
+                db.update(Document)
+                .where(Document.id == document.id)
+                .values(archive_entry_count=len(rows), last_modified=Document.last_modified)
+            )
+    except IntegrityError:
+        # Otra petición indexó el mismo documento a la vez
+        db.session.refresh(document)
+
+def list_entries(document):
+    # Índice perezoso: el directorio central se lee la primera vez que se
+    # pide el contenido y después se sirve desde archive_entries.
+    # El llamador hace el commit.
+    if document.archive_entry_count is None:
+        _build_index(document)
+    return db.session.execute(
+        db.select(ArchiveEntry)
+        .where(ArchiveEntry.document_id == document.id)
+        .order_by(ArchiveEntry.position)
+    ).scalars().all()
+
+def remove_entries(document_ids):
+    # document_ids puede ser una lista o un select
+    db.session.execute(
+        db.delete(ArchiveEntry)
+        .where(ArchiveEntry.document_id.in_(document_ids))
+        .execution_options(synchronize_session=False)
+    )
+
+def _zip_blocks(path, header_offset, compress_type, compressed_size):
+    # Salta directamente a la cabecera local de la entrada: ni se vuelve a
+    # leer el directorio central ni se extrae nada más. La cabecera se valida
+    # aquí, antes de empezar la respuesta; el archivo se reabre al iterar
+    with open(path, 'rb') as f:
+        f.seek(header_offset)
+        header = f.read(LOCAL_HEADER_SIZE)
+        if len(header) < LOCAL_HEADER_SIZE or header[:4] != LOCAL_HEADER_SIGNATURE:
+            raise _damaged()
+        name_length, extra_length = struct.unpack('<HH', header[26:30])
+    data_offset = header_offset + LOCAL_HEADER_SIZE + name_length + extra_length
+
+    decompressor = zlib.decompressobj(-zlib.MAX_WBITS) if compress_type == zipfile.ZIP_DEFLATED else None
+
+    def blocks():
+        # Produce (bytes comprimidos leídos, bloque descomprimido); cada
+        # llamada a decompress devuelve como mucho READ_SIZE bytes
+        with open(path, 'rb') as f:
+            f.seek(data_offset)
+            remaining = compressed_size
+            consumed = 0
+            pending = b''
+            while remaining or pending:
+                if not pending:
+                    pending = f.read(min(READ_SIZE, remaining))
+                    if not pending:
+                        raise ArchiveLimitError('entrada truncada')
+                    remaining -= len(pending)
+                    consumed += len(pending)
+                if decompressor is None:
+                    block, pending = pending, b''
+                else:
+                    block = decompressor.decompress(pending, READ_SIZE)
+                    pending = decompressor.unconsumed_tail
+                if block:
+                    yield consumed, block
+            if decompressor is not None:
+                block = decompressor.flush()
+                if block:
+                    yield consumed, block
+
+    return blocks()
+
+def _library_blocks(open_archive, position):
+    # Métodos que no se descomprimen a mano: el lector de la biblioteca
+    # también va por trozos, pero sin contar los bytes comprimidos. El
+    # archivo se abre al iterar: si la respuesta no llega a leerse, no
+    # queda ningún descriptor abierto
+    def blocks():
+        with open_archive() as archive:
+            with archive.open(archive.infolist()[position]) as stream:
+                for block in iter(lambda: stream.read(READ_SIZE), b''):
+                    yield None, block
+
+    return blocks()
+
+def _guard(blocks, declared_size, max_ratio, crc=None):
+    # Corta la descarga si la entrada descomprime más de lo declarado o con
+    # una proporción de bomba; con el stream ya empezado solo queda cortar
+    produced = 0
+    checksum = 0
+    for consumed, block in blocks:
+        produced += len(block)
+        if produced > declared_size:
+            raise ArchiveLimitError('la entrada descomprime más de lo declarado')
+        if consumed is not None and produced > RATIO_GRACE and produced > consumed * max_ratio:
+            raise ArchiveLimitError('proporción de compresión excesiva')
+        if crc is not None:
+            checksum = zlib.crc32(block, checksum)
+        yield block
+    if produced != declared_size or (crc is not None and checksum != crc):
+        raise ArchiveLimitError('la entrada no coincide con el directorio central')
+
+def _logged(chunks, document_id, position):
+    try:
+        yield from chunks
+    except ArchiveLimitError as e:
+        logger.warning('Descarga cortada de la entrada %s del documento %s: %s', position, document_id, e)
+        raise
+
+def send_member(document, position):
+    list_entries(document)
+    entry = db.session.execute(
+        db.select(ArchiveEntry).where(ArchiveEntry.document_id == document.id, ArchiveEntry.position == position)
+    ).scalar_one_or_none()
+    if entry is None:
+        raise APIError('Entrada no encontrada', 404)
+    if entry.is_dir:
+        raise APIError('La entrada es un directorio', 400)
+    if entry.encrypted:
+        raise APIError('La entrada está cifrada', 415)
+    if document.file_type == '7z':
+        # 7z comprime en bloques sólidos: sacar una entrada obliga a
+        # descomprimir todo lo anterior del bloque
+        raise APIError('Solo se pueden extraer entradas de archivos zip y rar', 415)
+
+    max_ratio = current_app.config.get('ARCHIVE_MAX_RATIO', DEFAULT_MAX_RATIO)
+    if entry.size > current_app.config.get('ARCHIVE_MAX_MEMBER_SIZE', DEFAULT_MAX_MEMBER_SIZE):
+        raise APIError('La entrada es demasiado grande', 413)
+    if entry.size > RATIO_GRACE and entry.size > entry.compressed_size * max_ratio:
+        raise APIError('La entrada tiene una proporción de compresión sospechosa', 422)
+
+    crc = None
+    if document.file_type == 'zip' and entry.compress_type in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+        blocks = _zip_blocks(document.file_path, entry.header_offset, entry.compress_type, entry.compressed_size)
+        crc = entry.crc
+    elif document.file_type == 'zip':
+        blocks = _library_blocks(lambda: zipfile.ZipFile(document.file_path), position)
+    else:
+        import rarfile
+        # Extraer necesita unrar (u otra herramienta) en el sistema; se
+        # comprueba antes de empezar la respuesta, como al listar sin rarfile
+        try:
+            rarfile.tool_setup()
+        except rarfile.RarCannotExec:
+            raise APIError('El servidor no puede extraer archivos rar', 501)
+        blocks = _library_blocks(lambda: rarfile.RarFile(document.file_path), position)
+
+    name = posixpath.basename(entry.name.rstrip('/'))
+    response = current_app.response_class(
+        _logged(_guard(blocks, entry.size, max_ratio, crc), document.id, position),
+        mimetype=mimetypes.guess_type(name)[0] or 'application/octet-stream',
+        direct_passthrough=True
+    )
+    response.headers.set('Content-Disposition', 'attachment', filename=name)
+    response.content_length = entry.size
+    return response
@@ -0,0 +1,116 @@
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import os
+import re
+import uuid
+import warnings
+
+from models import db
+from models.tombstone import FileTombstone
+from services import uploads
+
+logger = logging.getLogger(__name__)
+
+VARIANT_SIZES = (64, 128, 512)
+DEFAULT_SIZE = 128
+AVATAR_ROOT = os.path.join('uploads', 'profile_pictures')
+ALLOWED_EXTENSIONS = {'jpg', 'jpeg', 'png', 'gif', 'webp'}
+HASH_LENGTH = 16
+_HASH_RE = re.compile(r'^[0-9a-f]{%d}$' % HASH_LENGTH)
+
+# Un solo hilo: redimensionar es CPU y no debe competir con las peticiones
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='avatars')
+
+def valid_hash(avatar_hash):
+    return bool(_HASH_RE.match(avatar_hash))
+
+def avatar_dir(user_id, avatar_hash):
+    return os.path.join(AVATAR_ROOT, str(user_id), avatar_hash)
+
+def variant_path(user_id, avatar_hash, size):
+    return os.path.join(avatar_dir(user_id, avatar_hash), f'{size}.webp')
+
+def parse_variant_path(path):
+    # uploads/profile_pictures/<user_id>/<hash>/<size>.webp -> (user_id, hash)
+    parts = os.path.normpath(path).split(os.sep)
+    root = os.path.normpath(AVATAR_ROOT).split(os.sep)
+    if parts[:len(root)] != root or len(parts) != len(root) + 3:
+        return None
+    user_id, avatar_hash, name = parts[len(root):]
+    if not user_id.isdigit() or not valid_hash(avatar_hash) or not name.endswith('.webp'):
+        return None
+    return int(user_id), avatar_hash
+
+def pick_size(requested):
+    for size in VARIANT_SIZES:
+        if size >= requested:
+            return size
+    return VARIANT_SIZES[-1]
+
+def valid_image(path, file_ext):
+    # La firma debe corresponder a la extensión; con Pillow, además, la imagen
+    # debe poder decodificarse y no pasar de Image.MAX_IMAGE_PIXELS
+    with open(path, 'rb') as f:
+        if not uploads.magic_matches(file_ext, f.read(uploads.SNIFF_LENGTH)):
+            return False
+    try:
+        from PIL import Image
+    except ImportError:
+        return True
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', Image.DecompressionBombWarning)
+            with Image.open(path) as image:
+                image.verify()
+    except (OSError, SyntaxError, ValueError, Image.DecompressionBombWarning, Image.DecompressionBombError):
+        return False
+    return True
+
+def render_variant(source, user_id, avatar_hash, size):
+    # Pillow es opcional: sin él se sirve el original
+    try:
+        from PIL import Image, ImageOps
+    except ImportError:
+        return None
+
+    dest = variant_path(user_id, avatar_hash, size)
+    if os.path.exists(dest):
+        return dest
+    try:
+        with Image.open(source) as image:
+            image = ImageOps.exif_transpose(image)
+            image.thumbnail((size, size))
+            if image.mode not in ('RGB', 'RGBA'):
+                image = image.convert('RGBA')
+            # Temporal propio: el executor y get_avatar pueden generar la misma variante a la vez
+            tmp_path = f'{dest}.{uuid.uuid4().hex}.tmp'
+            try:
+                image.save(tmp_path, 'WEBP', quality=80, method=4)
+                os.replace(tmp_path, dest)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+    except (OSError, SyntaxError, ValueError, Image.DecompressionBombError):
+        # Original ilegible o demasiado grande: quien llama sirve el original
+        logger.warning('No se pudo generar la variante %s de %s', size, source, exc_info=True)
+        return None
+    return dest
+
+def _generate(source, user_id, avatar_hash):
+    try:
+        for size in VARIANT_SIZES:
+            render_variant(source, user_id, avatar_hash, size)
+    except Exception:
+        logger.exception('No se pudieron generar las variantes del avatar de %s', user_id)
+
+def schedule(source, user_id, avatar_hash):
+    _executor.submit(_generate, source, user_id, avatar_hash)
+
+def retire(user_id, profile_picture, avatar_hash):
+    # El original y las variantes anteriores pasan al barrendero; el llamador hace el commit
+    paths = [profile_picture] if profile_picture else []
+    if avatar_hash:
+        paths += [variant_path(user_id, avatar_hash, size) for size in VARIANT_SIZES]
+    if paths:
+        db.session.execute(db.insert(FileTombstone), [{'file_path': path} for path in paths])
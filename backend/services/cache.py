@@ -0,0 +1,70 @@
+from collections import OrderedDict
+import threading
+import time
+
+class TTLCache:
+    # LRU acotado con caducidad por entrada; seguro entre hilos del mismo proceso.
+    # Opcionalmente acotado también por peso total (p. ej. bytes) con max_weight.
+    def __init__(self, maxsize=1024, ttl=60, max_weight=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_weight = max_weight
+        self._data = OrderedDict()
+        self._weight = 0
+        self._lock = threading.Lock()
+
+    def _pop(self, key):
+        _, _, weight = self._data.pop(key)
+        self._weight -= weight
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires_at, _ = entry
+            if expires_at < time.monotonic():
+                self._pop(key)
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None, weight=1):
+        if self.max_weight is not None and weight > self.max_weight:
+            return
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            if key in self._data:
+                self._pop(key)
+            self._data[key] = (value, expires_at, weight)
+            self._weight += weight
+            while len(self._data) > self.maxsize or (
+                self.max_weight is not None and self._weight > self.max_weight
+            ):
+                self._pop(next(iter(self._data)))
+
+    def delete(self, key):
+        with self._lock:
+            if key in self._data:
+                self._pop(key)
+
+    def items(self):
+        # Copia de las entradas vigentes; las caducadas se descartan al pasar
+        now = time.monotonic()
+        with self._lock:
+            expired = [key for key, (_, expires_at, _) in self._data.items() if expires_at < now]
+            for key in expired:
+                self._pop(key)
+            return [(key, value) for key, (value, _, _) in self._data.items()]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._weight = 0
+
+    @property
+    def weight(self):
+        return self._weight
+
+    def __len__(self):
+        return len(self._data)
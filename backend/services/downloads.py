@@ -0,0 +1,48 @@
+import mimetypes
+import os
+
+from flask import current_app, request, send_file
+
+def document_etag(document):
+    if document.checksum:
+        return document.checksum
+    return f"{document.id}-{document.file_size}-{int(document.last_modified.timestamp())}"
+
+def _accel_response(document, etag, as_attachment):
+    # nginx sirve el archivo (y los Range) desde una location interna
+    relative_path = os.path.relpath(document.file_path, current_app.config['UPLOAD_FOLDER'])
+    internal_path = current_app.config['X_ACCEL_PREFIX'].rstrip('/') + '/' + relative_path.replace(os.sep, '/')
+
+    response = current_app.response_class(
+        mimetype=mimetypes.guess_type(document.original_filename)[0] or 'application/octet-stream'
+    )
+    response.headers['X-Accel-Redirect'] = internal_path
+    response.headers.set(
+        'Content-Disposition',
+        'attachment' if as_attachment else 'inline',
+        filename=document.original_filename
+    )
+    response.set_etag(etag)
+    response.last_modified = document.last_modified
+    return response.make_conditional(request)
+
+def send_document(document, as_attachment=True, public=False):
+    etag = document_etag(document)
+    if current_app.config.get('DOWNLOAD_OFFLOAD') == 'x-accel':
+        response = _accel_response(document, etag, as_attachment)
+    else:
+        # send_file responde 206 a Range y 304 a If-None-Match/If-Modified-Since;
+        # con USE_X_SENDFILE solo envía la cabecera X-Sendfile. Las rutas
+        # guardadas son relativas al directorio de trabajo, igual que al
+        # escribirlas; send_file las resolvería contra root_path
+        response = send_file(
+            os.path.abspath(document.file_path),
+            as_attachment=as_attachment,
+            download_name=document.original_filename,
+            etag=etag,
+            last_modified=document.last_modified,
+            conditional=True
+        )
+    if not public:
+        response.cache_control.private = True
+    return response
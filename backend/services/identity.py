@@ -0,0 +1,49 @@
+from flask import jsonify
+
+from models import db
+from models.user import User
+from services.cache import TTLCache
+
+# Instantáneas de usuario compartidas entre peticiones de este proceso. Otros
+# procesos pueden ver datos antiguos como mucho durante IDENTITY_CACHE_TTL.
+_snapshots = TTLCache()
+
+class UserSnapshot:
+    # Copia ligera de User para las rutas de solo lectura
+    def __init__(self, data):
+        self._data = data
+        self.id = data['id']
+
+    def to_dict(self):
+        return dict(self._data)
+
+def _load_user(_jwt_header, jwt_data):
+    user_id = int(jwt_data['sub'])
+    snapshot = _snapshots.get(user_id)
+    if snapshot is None:
+        user = db.session.get(User, user_id)
+        if user is None:
+            return None
+        snapshot = UserSnapshot(user.to_dict())
+        _snapshots.set(user_id, snapshot)
+    return snapshot
+
+def _user_not_found(_jwt_header, _jwt_data):
+    return jsonify({
+        'status': 'error',
+        'message': 'Usuario no encontrado'
+    }), 404
+
+def get_user(user_id):
+    # Objeto ORM para las rutas que modifican el usuario; si el loader ya lo
+    # cargó en esta petición sale del identity map de la sesión sin consulta
+    return db.session.get(User, int(user_id))
+
+def invalidate(user_id):
+    _snapshots.delete(int(user_id))
+
+def init_app(app, jwt):
+    _snapshots.maxsize = app.config.get('IDENTITY_CACHE_SIZE', 1024)
+    _snapshots.ttl = app.config.get('IDENTITY_CACHE_TTL', 60)
+    jwt.user_lookup_loader(_load_user)
+    jwt.user_lookup_error_loader(_user_not_found)
@@ -0,0 +1,187 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import atexit
+import logging
+import threading
+
+from models import db
+from models.document import Document
+from models.job import ProcessingJob
+from services import retrieval, storage
+
+logger = logging.getLogger(__name__)
+
+# Segundos de espera antes de reintentar, multiplicados por el número de intento
+RETRY_BACKOFF = 5
+# Un trabajo 'running' sin terminar tras este tiempo se da por perdido (worker caído)
+STALE_AFTER = timedelta(minutes=10)
+
+def _sniff_mime(document):
+    # python-magic necesita libmagic en el sistema; sin ella se omite la etapa
+    try:
+        import magic
+    except ImportError:
+        return
+    document.mime_type = magic.from_file(document.file_path, mime=True)
+
+def _hash_file(document):
+    # Las subidas ya calculan el hash mientras se guardan
+    if not document.checksum:
+        document.checksum = storage.hash_file(document.file_path)
+
+def _index_text(document):
+    retrieval.index_document(document)
+
+# Las etapas deben ser idempotentes: un reintento vuelve a ejecutarlas todas
+STAGES = [_sniff_mime, _hash_file, _index_text]
+
+def enqueue(document):
+    # El documento ya debe tener id (flush); el llamador hace el commit
+    document.status = 'pending'
+    db.session.add(ProcessingJob(document_id=document.id))
+
+class JobRunner:
+    def __init__(self, app, workers=2, poll_interval=2.0):
+        self.app = app
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='document-jobs')
+        self._slots = threading.Semaphore(workers)
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._dispatch, name='document-jobs-dispatcher', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        atexit.register(self.shutdown)
+
+    def wake(self):
+        self._wake.set()
+
+    def shutdown(self, wait=True):
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        self._wake.set()
+        self._thread.join()
+        self._executor.shutdown(wait=wait)
+
+    def _claimable(self, now):
+        return db.or_(
+            db.and_(ProcessingJob.status == 'queued', ProcessingJob.run_after <= now),
+            db.and_(ProcessingJob.status == 'running', ProcessingJob.locked_at < now - STALE_AFTER)
+        )
+
+    def _claim(self):
+        # Reclamo optimista: varios procesos pueden competir por la misma fila
+        while True:
+            now = datetime.utcnow()
+            job_id = db.session.execute(
+                db.select(ProcessingJob.id)
+                .where(self._claimable(now))
+                .order_by(ProcessingJob.id)
+                .limit(1)
+            ).scalar()
+            if job_id is None:
+                return None
+
+            result = db.session.execute(
+                db.update(ProcessingJob)
+                .where(ProcessingJob.id == job_id, self._claimable(now))
+                .values(status='running', locked_at=now, attempts=ProcessingJob.attempts + 1)
+            )
+            db.session.commit()
+            if result.rowcount == 1:
+                return job_id
+
+    def _dispatch(self):
+        while not self._stop.is_set():
+            if not self._slots.acquire(timeout=self.poll_interval):
+                continue
+
+            try:
+                with self.app.app_context():
+                    job_id = self._claim()
+            except Exception:
+                logger.exception('Error al buscar trabajos pendientes')
+                job_id = None
+
+            if job_id is None:
+                self._slots.release()
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+                continue
+
+            self._executor.submit(self._run, job_id)
+
+    def _run(self, job_id):
+        try:
+            with self.app.app_context():
+                self._process(job_id)
+        except Exception:
+            logger.exception('Error inesperado en el trabajo %s', job_id)
+        finally:
+            self._slots.release()
+
+    def _discard(self, job_id):
+        # Los trabajos terminados no se conservan; solo quedan los fallidos
+        db.session.execute(db.delete(ProcessingJob).where(ProcessingJob.id == job_id))
+        db.session.commit()
+
+    def _process(self, job_id):
+        job = db.session.get(ProcessingJob, job_id)
+        document = db.session.get(Document, job.document_id)
+        if document is None:
+            # El documento se eliminó mientras esperaba en la cola
+            self._discard(job_id)
+            return
+
+        document.status = 'processing'
+        db.session.commit()
+
+        try:
+            for stage in STAGES:
+                stage(document)
+
+            # Puede haberse borrado durante las etapas: se relee bloqueado para
+            # no dejar trozos ni estadísticas de un documento que ya no existe
+            with db.session.no_autoflush:
+                exists = db.session.execute(
+                    db.select(Document.id).where(Document.id == document.id).with_for_update()
+                ).scalar()
+            if exists is None:
+                db.session.rollback()
+                self._discard(job_id)
+                return
+
+            document.status = 'ready'
+            db.session.delete(job)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            job = db.session.get(ProcessingJob, job_id)
+            if job is None:
+                # El documento se borró (y su trabajo con él) durante el proceso
+                return
+            document = db.session.get(Document, job.document_id)
+            job.last_error = repr(e)
+            if job.attempts >= job.max_attempts:
+                job.status = 'failed'
+                if document:
+                    document.status = 'failed'
+            else:
+                job.status = 'queued'
+                job.run_after = datetime.utcnow() + timedelta(seconds=RETRY_BACKOFF * job.attempts)
+                if document:
+                    document.status = 'pending'
+            db.session.commit()
+            logger.warning('Trabajo %s falló (intento %s): %r', job_id, job.attempts, e)
+
+def init_app(app):
+    workers = app.config.get('DOCUMENT_JOB_WORKERS', 0)
+    if workers <= 0:
+        return None
+    runner = JobRunner(app, workers=workers)
+    app.extensions['document_jobs'] = runner
+    runner.start()
+    return runner
@@ -0,0 +1,287 @@
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+import atexit
+import json
+import os
+import threading
+import time
+
+from flask import Response, g, request
+
+from services import passwords, query_stats
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin varios workers no hace falta el cerrojo
+    fcntl = None
+
+# Límites superiores de los buckets de latencia, en segundos
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SNAPSHOT_INTERVAL = 5  # segundos entre volcados al directorio compartido
+# Contadores acumulados de workers que ya terminaron
+DEAD_SNAPSHOT = 'dead.json'
+LOCK_FILE = '.lock'
+
+_lock = threading.Lock()
+_latency = defaultdict(lambda: [[0] * (len(BUCKETS) + 1), 0.0])  # endpoint -> [buckets, suma]
+_status = defaultdict(int)  # (endpoint, status) -> peticiones
+_in_flight = defaultdict(int)  # endpoint -> peticiones en curso
+_config = {'dir': None, 'pid': None}
+
+def _endpoint():
+    return request.endpoint or 'unknown'
+
+def _before_request():
+    # Con gunicorn --preload el hilo de volcado debe arrancarse en cada worker
+    if _config['dir'] and _config['pid'] != os.getpid():
+        _start_snapshots()
+    g._metrics_start = time.perf_counter()
+    g._metrics_endpoint = _endpoint()
+    with _lock:
+        _in_flight[g._metrics_endpoint] += 1
+
+def _after_request(response):
+    start = g.get('_metrics_start')
+    if start is None:
+        return response
+    elapsed = time.perf_counter() - start
+    endpoint = g._metrics_endpoint
+    index = bisect_left(BUCKETS, elapsed)
+    with _lock:
+        entry = _latency[endpoint]
+        entry[0][index] += 1
+        entry[1] += elapsed
+        _status[(endpoint, response.status_code)] += 1
+    return response
+
+def _teardown_request(_error):
+    endpoint = g.pop('_metrics_endpoint', None)
+    if endpoint is not None:
+        with _lock:
+            _in_flight[endpoint] -= 1
+
+def _labels(**labels):
+    return ','.join(f'{key}="{value}"' for key, value in labels.items())
+
+def collect():
+    # Muestras de este proceso: {nombre: {'type', 'help', 'values': {etiquetas: valor}}}
+    with _lock:
+        latency = {endpoint: (list(buckets), total) for endpoint, (buckets, total) in _latency.items()}
+        status = dict(_status)
+        in_flight = dict(_in_flight)
+
+    samples = {
+        'http_request_duration_seconds': {
+            'type': 'histogram',
+            'help': 'Latencia de las peticiones por endpoint',
+            'values': {
+                _labels(endpoint=endpoint, blueprint=endpoint.split('.', 1)[0]): {'buckets': buckets, 'sum': total}
+                for endpoint, (buckets, total) in latency.items()
+            }
+        },
+        'http_requests_total': {
+            'type': 'counter',
+            'help': 'Peticiones por endpoint y código de estado',
+            'values': {_labels(endpoint=endpoint, status=code): count for (endpoint, code), count in status.items()}
+        },
+        'http_requests_in_flight': {
+            'type': 'gauge',
+            'help': 'Peticiones en curso por endpoint',
+            'values': {_labels(endpoint=endpoint): count for endpoint, count in in_flight.items()}
+        },
+    }
+
+    sql = query_stats.stats()
+    for name, key, help_text in (
+        ('sql_queries_total', 'queries', 'Sentencias SQL por endpoint'),
+        ('sql_query_seconds_total', 'seconds', 'Tiempo en SQL por endpoint'),
+        ('sql_slow_queries_total', 'slow', 'Consultas lentas por endpoint'),
+        ('sql_n_plus_one_requests_total', 'n_plus_one', 'Peticiones con posible N+1 por endpoint'),
+    ):
+        samples[name] = {
+            'type': 'counter',
+            'help': help_text,
+            'values': {_labels(endpoint=endpoint): totals[key] for endpoint, totals in sql.items()}
+        }
+
+    hashing = passwords.stats()
+    samples['password_hash_in_flight'] = {
+        'type': 'gauge', 'help': 'Hashes de contraseña en curso', 'values': {'': hashing['in_flight']}
+    }
+    samples['password_hash_rejected_total'] = {
+        'type': 'counter', 'help': 'Hashes rechazados por saturación', 'values': {'': hashing['rejected']}
+    }
+    samples['password_hash_seconds_total'] = {
+        'type': 'counter', 'help': 'Tiempo de CPU en hashes de contraseña',
+        'values': {_labels(kind=kind): hashing[kind]['total_seconds'] for kind in ('hash', 'verify')}
+    }
+    samples['password_hash_operations_total'] = {
+        'type': 'counter', 'help': 'Operaciones de hash de contraseña',
+        'values': {_labels(kind=kind): hashing[kind]['count'] for kind in ('hash', 'verify')}
+    }
+    return samples
+
+def _snapshot_path(pid):
+    return os.path.join(_config['dir'], f'{pid}.json')
+
+def _write_snapshot():
+    path = _snapshot_path(os.getpid())
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(collect(), f)
+    os.replace(tmp_path, path)
+
+def _snapshot_loop():
+    while True:
+        time.sleep(SNAPSHOT_INTERVAL)
+        try:
+            _write_snapshot()
+        except OSError:
+            pass
+
+def _start_snapshots():
+    with _lock:
+        if _config['pid'] == os.getpid():
+            return
+        _config['pid'] = os.getpid()
+    # Un archivo con nuestro pid es de un proceso anterior que tuvo el mismo
+    # pid: se acumula antes de sobrescribirlo para que no retrocedan los contadores
+    if os.path.exists(_snapshot_path(os.getpid())):
+        _fold_dead([os.getpid()])
+    threading.Thread(target=_snapshot_loop, name='metrics-snapshot', daemon=True).start()
+    atexit.register(_write_snapshot)
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def _read_snapshot(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+@contextmanager
+def _dir_lock():
+    with open(os.path.join(_config['dir'], LOCK_FILE), 'a') as f:
+        if fcntl:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+def _fold_dead(pids):
+    # Suma los contadores de los workers muertos a dead.json y borra sus
+    # archivos: el directorio no crece con cada despliegue y un pid reutilizado
+    # no pisa contadores ajenos
+    dead_path = os.path.join(_config['dir'], DEAD_SNAPSHOT)
+    with _dir_lock():
+        totals = _read_snapshot(dead_path) or {}
+        folded = []
+        for pid in pids:
+            samples = _read_snapshot(_snapshot_path(pid))
+            if samples is None:
+                continue
+            _merge(totals, samples, include_gauges=False)
+            folded.append(pid)
+        if not folded:
+            return
+        tmp_path = f'{dead_path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(totals, f)
+        os.replace(tmp_path, dead_path)
+        for pid in folded:
+            try:
+                os.remove(_snapshot_path(pid))
+            except OSError:
+                pass
+
+def _merge(target, samples, include_gauges):
+    for name, metric in samples.items():
+        if metric['type'] == 'gauge' and not include_gauges:
+            continue
+        merged = target.setdefault(name, {'type': metric['type'], 'help': metric['help'], 'values': {}})
+        for labels, value in metric['values'].items():
+            if metric['type'] == 'histogram':
+                current = merged['values'].setdefault(labels, {'buckets': [0] * len(value['buckets']), 'sum': 0.0})
+                current['buckets'] = [a + b for a, b in zip(current['buckets'], value['buckets'])]
+                current['sum'] += value['sum']
+            else:
+                merged['values'][labels] = merged['values'].get(labels, 0) + value
+
+def aggregate():
+    # Con METRICS_DIR cada worker vuelca sus contadores y /metrics suma todos;
+    # los de procesos que ya no existen se acumulan en dead.json sin gauges
+    merged = {}
+    own_pid = os.getpid()
+    _merge(merged, collect(), include_gauges=True)
+    if not _config['dir']:
+        return merged
+
+    dead = []
+    for filename in os.listdir(_config['dir']):
+        name, extension = os.path.splitext(filename)
+        if extension != '.json' or not name.isdigit():
+            continue
+        pid = int(name)
+        if pid == own_pid:
+            continue
+        if not _pid_alive(pid):
+            dead.append(pid)
+            continue
+        samples = _read_snapshot(os.path.join(_config['dir'], filename))
+        if samples is not None:
+            _merge(merged, samples, include_gauges=True)
+
+    if dead:
+        _fold_dead(dead)
+    totals = _read_snapshot(os.path.join(_config['dir'], DEAD_SNAPSHOT))
+    if totals:
+        _merge(merged, totals, include_gauges=False)
+    return merged
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def render(samples):
+    lines = []
+    for name in sorted(samples):
+        metric = samples[name]
+        lines.append(f'# HELP {name} {metric["help"]}')
+        lines.append(f'# TYPE {name} {metric["type"]}')
+        for labels, value in sorted(metric['values'].items()):
+            if metric['type'] == 'histogram':
+                cumulative = 0
+                for bound, count in zip(BUCKETS + ('+Inf',), value['buckets']):
+                    cumulative += count
+                    le = _labels(le=bound)
+                    lines.append(f'{name}_bucket{{{labels + "," + le if labels else le}}} {cumulative}')
+                suffix = f'{{{labels}}}' if labels else ''
+                lines.append(f'{name}_sum{suffix} {_format_value(value["sum"])}')
+                lines.append(f'{name}_count{suffix} {cumulative}')
+            else:
+                suffix = f'{{{labels}}}' if labels else ''
+                lines.append(f'{name}{suffix} {_format_value(value)}')
+    return '\n'.join(lines) + '\n'
+
+def metrics_view():
+    return Response(render(aggregate()), mimetype='text/plain; version=0.0.4')
+
+def init_app(app):
+    _config['dir'] = app.config.get('METRICS_DIR') or None
+    if _config['dir']:
+        os.makedirs(_config['dir'], exist_ok=True)
+
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
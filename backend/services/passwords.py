@@ -0,0 +1,120 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+from errors import APIError
+
+# Método y parámetros actuales; los hashes con otros parámetros se regeneran en el login
+DEFAULT_METHOD = 'scrypt:32768:8:1'
+LATENCY_SAMPLES = 1024
+RETRY_AFTER = 2  # segundos sugeridos al rechazar por saturación
+
+class _Latency:
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.samples = deque(maxlen=LATENCY_SAMPLES)
+
+    def record(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.samples.append(seconds)
+
+    def to_dict(self):
+        ordered = sorted(self.samples)
+
+        def pct(p):
+            if not ordered:
+                return 0.0
+            return round(ordered[min(len(ordered) - 1, int(len(ordered) * p))] * 1000, 2)
+
+        return {
+            'count': self.count,
+            'total_seconds': round(self.total, 3),
+            'p50_ms': pct(0.50),
+            'p99_ms': pct(0.99),
+        }
+
+class _Hasher:
+    def __init__(self, workers=2, max_pending=32, method=DEFAULT_METHOD, prefix=None):
+        self.method = method
+        # Prefijo que werkzeug escribe para este método, con los parámetros por defecto expandidos
+        self.prefix = prefix or method
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+        # Hashes en curso + en espera; por encima se rechaza en vez de encolar
+        self._pending = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._latency = {'hash': _Latency(), 'verify': _Latency()}
+        self.in_flight = 0
+        self.rejected = 0
+
+    def _timed(self, kind, func, *args):
+        start = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self._latency[kind].record(elapsed)
+
+    def run(self, kind, func, *args):
+        if not self._pending.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise APIError(
+                'Servidor ocupado, inténtalo de nuevo en unos segundos', 503,
+                headers={'Retry-After': str(RETRY_AFTER)}
+            )
+        with self._lock:
+            self.in_flight += 1
+        try:
+            return self._executor.submit(self._timed, kind, func, *args).result()
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+            self._pending.release()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'method': self.method,
+                'in_flight': self.in_flight,
+                'rejected': self.rejected,
+                'hash': self._latency['hash'].to_dict(),
+                'verify': self._latency['verify'].to_dict(),
+            }
+
+_hasher = _Hasher()
+
+def hash_password(password):
+    return _hasher.run('hash', generate_password_hash, password, _hasher.method)
+
+def check_password(password_hash, password):
+    if not password_hash:
+        return False
+    return _hasher.run('verify', check_password_hash, password_hash, password)
+
+def needs_rehash(password_hash):
+    # Formato de werkzeug: "<método>:<parámetros>$<sal>$<hash>"
+    return bool(password_hash) and password_hash.split('$', 1)[0] != _hasher.prefix
+
+def stats():
+    return _hasher.stats()
+
+def _canonical_prefix(method):
+    # werkzeug acepta abreviaturas ('scrypt', 'pbkdf2') y escribe el método
+    # completo; se obtiene una vez hasheando un valor cualquiera
+    return generate_password_hash('', method).split('$', 1)[0]
+
+def init_app(app):
+    global _hasher
+    method = app.config.get('PASSWORD_HASH_METHOD', DEFAULT_METHOD)
+    _hasher = _Hasher(
+        workers=app.config.get('PASSWORD_HASH_WORKERS', 2),
+        max_pending=app.config.get('PASSWORD_HASH_MAX_PENDING', 32),
+        method=method,
+        prefix=_canonical_prefix(method)
+    )
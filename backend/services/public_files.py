@@ -0,0 +1,94 @@
+import mimetypes
+
+from flask import current_app, jsonify, request
+
+from models.document import Document
+from services import downloads
+from services.cache import TTLCache
+
+# token -> PublicFile. Los cambios hechos en este proceso se invalidan al
+# momento; otros workers pueden servir la entrada como mucho PUBLIC_CACHE_TTL.
+_entries = TTLCache(maxsize=4096, ttl=30)
+# token -> bytes de archivos pequeños, acotado por tamaño total
+_contents = TTLCache(maxsize=4096, ttl=30, max_weight=64 * 1024 * 1024)
+_config = {'max_file': 256 * 1024, 'max_age': 86400}
+
+class PublicFile:
+    # Lo necesario para servir el archivo sin volver a consultar Document
+    def __init__(self, document):
+        self.id = document.id
+        self.user_id = document.user_id
+        self.share_token = document.share_token
+        self.file_path = document.file_path
+        self.original_filename = document.original_filename
+        self.file_size = document.file_size
+        self.checksum = document.checksum
+        self.last_modified = document.last_modified
+
+def lookup(token):
+    entry = _entries.get(token)
+    if entry is not None:
+        return entry
+
+    document = Document.query.filter_by(share_token=token, is_public=True).first()
+    if document is None:
+        return None
+    entry = PublicFile(document)
+    _entries.set(token, entry)
+    return entry
+
+def _content(entry):
+    if entry.file_size > _config['max_file']:
+        return None
+    content = _contents.get(entry.share_token)
+    if content is None:
+        with open(entry.file_path, 'rb') as f:
+            content = f.read()
+        _contents.set(entry.share_token, content, weight=len(content))
+    return content
+
+def _cache_headers(response):
+    # El contenido de un token no cambia: al despublicar se borra el token
+    response.cache_control.public = True
+    response.cache_control.max_age = _config['max_age']
+    response.cache_control.immutable = True
+    return response
+
+def send(entry):
+    try:
+        content = _content(entry)
+        if content is None:
+            return _cache_headers(downloads.send_document(entry, as_attachment=False, public=True))
+    except FileNotFoundError:
+        # El documento se borró después de cachear la entrada
+        invalidate(entry.share_token)
+        return jsonify({'error': 'Archivo no encontrado'}), 404
+
+    response = current_app.response_class(
+        content,
+        mimetype=mimetypes.guess_type(entry.original_filename)[0] or 'application/octet-stream'
+    )
+    response.headers.set('Content-Disposition', 'inline', filename=entry.original_filename)
+    response.set_etag(downloads.document_etag(entry))
+    response.last_modified = entry.last_modified
+    response = response.make_conditional(request, accept_ranges=True, complete_length=len(content))
+    return _cache_headers(response)
+
+def invalidate(token):
+    if not token:
+        return
+    _entries.delete(token)
+    _contents.delete(token)
+
+def invalidate_user(user_id):
+    # Sin índice por usuario: se recorren las entradas vigentes, acotadas por maxsize
+    for token, entry in _entries.items():
+        if entry.user_id == user_id:
+            _entries.delete(token)
+            _contents.delete(token)
+
+def init_app(app):
+    _entries.ttl = _contents.ttl = app.config.get('PUBLIC_CACHE_TTL', 30)
+    _contents.max_weight = app.config.get('PUBLIC_CACHE_MAX_BYTES', 64 * 1024 * 1024)
+    _config['max_file'] = app.config.get('PUBLIC_CACHE_MAX_FILE', 256 * 1024)
+    _config['max_age'] = app.config.get('PUBLIC_CACHE_MAX_AGE', 86400)
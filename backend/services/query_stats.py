@@ -0,0 +1,97 @@
+from collections import Counter, defaultdict
+import logging
+import threading
+import time
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+# Repeticiones de la misma sentencia en una petición a partir de las que se sospecha N+1
+N_PLUS_ONE_THRESHOLD = 5
+
+_lock = threading.Lock()
+_endpoints = defaultdict(lambda: {'requests': 0, 'queries': 0, 'seconds': 0.0, 'n_plus_one': 0, 'slow': 0})
+_config = {'slow_seconds': 0.2, 'n_plus_one_threshold': N_PLUS_ONE_THRESHOLD, 'headers': False}
+
+def _redact(parameters):
+    # En el log solo los tipos: los valores pueden ser emails, hashes, textos...
+    if isinstance(parameters, dict):
+        return {key: type(value).__name__ for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        if parameters and isinstance(parameters[0], (dict, list, tuple)):
+            return f'<{len(parameters)} filas>'
+        return [type(value).__name__ for value in parameters]
+    return type(parameters).__name__
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # En el contexto de ejecución y no en conn.info: si la sentencia falla no
+    # llega after_cursor_execute y no debe quedar nada en la conexión del pool
+    context._query_start = time.perf_counter()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context._query_start
+    slow = elapsed >= _config['slow_seconds']
+    if slow:
+        logger.warning(
+            'Consulta lenta (%.1f ms) en %s: %s params=%s',
+            elapsed * 1000,
+            request.endpoint if has_request_context() else 'segundo plano',
+            statement,
+            _redact(parameters)
+        )
+
+    if not has_request_context():
+        return
+    stats = g.get('_query_stats')
+    if stats is None:
+        stats = g._query_stats = {'queries': 0, 'seconds': 0.0, 'slow': 0, 'shapes': Counter()}
+    stats['queries'] += 1
+    stats['seconds'] += elapsed
+    stats['slow'] += slow
+    # Las sentencias ya vienen parametrizadas: el texto es la "forma" de la consulta
+    stats['shapes'][statement] += 1
+
+def _record_request(response):
+    stats = g.get('_query_stats')
+    if stats is None:
+        return response
+
+    threshold = _config['n_plus_one_threshold']
+    repeated = {shape: count for shape, count in stats['shapes'].items() if count >= threshold}
+    if repeated:
+        shape, count = max(repeated.items(), key=lambda item: item[1])
+        logger.warning('Posible N+1 en %s: %d ejecuciones de %s', request.endpoint, count, shape)
+
+    endpoint = request.endpoint or 'unknown'
+    with _lock:
+        totals = _endpoints[endpoint]
+        totals['requests'] += 1
+        totals['queries'] += stats['queries']
+        totals['seconds'] += stats['seconds']
+        totals['slow'] += stats['slow']
+        totals['n_plus_one'] += bool(repeated)
+
+    # En modo debug siempre; en producción solo si se activa SQL_DEBUG_HEADERS
+    if _config['headers'] or current_app.debug:
+        response.headers['X-SQL-Queries'] = str(stats['queries'])
+        response.headers['X-SQL-Time-Ms'] = f"{stats['seconds'] * 1000:.2f}"
+        if repeated:
+            response.headers['X-SQL-N-Plus-One'] = str(len(repeated))
+    return response
+
+def stats():
+    with _lock:
+        return {endpoint: dict(totals) for endpoint, totals in _endpoints.items()}
+
+def init_app(app, db):
+    _config['slow_seconds'] = app.config.get('SLOW_QUERY_MS', 200) / 1000
+    _config['n_plus_one_threshold'] = app.config.get('N_PLUS_ONE_THRESHOLD', N_PLUS_ONE_THRESHOLD)
+    _config['headers'] = app.config.get('SQL_DEBUG_HEADERS', False)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+    app.after_request(_record_request)
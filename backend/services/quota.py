@@ -0,0 +1,216 @@
+from datetime import datetime
+import atexit
+import logging
+import os
+import threading
+
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+
+from models import db
+from models.document import Document
+from models.quota import StorageUsage
+from models.user import User
+
+logger = logging.getLogger(__name__)
+
+RECONCILE_BATCH = 500
+
+def _limit():
+    return current_app.config.get('STORAGE_QUOTA_BYTES', 0)
+
+def _ensure_row(user_id):
+    # Usuarios anteriores al contador: se parte de la suma de sus documentos
+    # (una sola vez por usuario)
+    totals = db.session.execute(
+        db.select(db.func.coalesce(db.func.sum(Document.file_size), 0), db.func.count(Document.id))
+        .where(Document.user_id == user_id)
+    ).one()
+    try:
+        with db.session.begin_nested():
+            db.session.add(StorageUsage(user_id=user_id, bytes_used=totals[0], document_count=totals[1]))
+    except IntegrityError:
+        # Otra petición creó la fila a la vez
+        pass
+
+def reserve(user_id, size):
+    # Suma size al uso del usuario si cabe en la cuota. El UPDATE condicional
+    # es atómico frente a subidas concurrentes. Devuelve False si no cabe.
+    # El llamador hace el commit; un rollback deshace la reserva.
+    limit = _limit()
+    for _ in range(2):
+        statement = (
+            db.update(StorageUsage)
+            .where(StorageUsage.user_id == user_id)
+            .values(
+                bytes_used=StorageUsage.bytes_used + size,
+                document_count=StorageUsage.document_count + 1
+            )
+        )
+        if limit:
+            statement = statement.where(StorageUsage.bytes_used + size <= limit)
+        if db.session.execute(statement).rowcount == 1:
+            return True
+
+        exists = db.session.execute(
+            db.select(StorageUsage.user_id).where(StorageUsage.user_id == user_id)
+        ).scalar()
+        if exists is not None:
+            return False
+        _ensure_row(user_id)
+    return False
+
+def fits(user_id, size):
+    # Comprobación previa sin reservar, p. ej. al iniciar una subida por trozos
+    limit = _limit()
+    if not limit:
+        return True
+    used = db.session.execute(
+        db.select(StorageUsage.bytes_used).where(StorageUsage.user_id == user_id)
+    ).scalar()
+    return (used or 0) + size <= limit
+
+def release(user_id, size, count=1):
+    # El llamador hace el commit
+    db.session.execute(
+        db.update(StorageUsage)
+        .where(StorageUsage.user_id == user_id)
+        .values(
+            bytes_used=StorageUsage.bytes_used - size,
+            document_count=StorageUsage.document_count - count
+        )
+    )
+
+def usage(user_id):
+    query = db.select(StorageUsage.bytes_used, StorageUsage.document_count).where(StorageUsage.user_id == user_id)
+    row = db.session.execute(query).first()
+    if row is None:
+        _ensure_row(user_id)
+        db.session.commit()
+        row = db.session.execute(query).one()
+    return {
+        'bytes_used': row.bytes_used,
+        'document_count': row.document_count,
+        'quota_bytes': _limit() or None
+    }
+
+def remove_user(user_id):
+    db.session.execute(db.delete(StorageUsage).where(StorageUsage.user_id == user_id))
+
+def _sync_file_sizes(user_ids):
+    # Corrige file_size con el tamaño real en disco; los archivos que faltan
+    # solo se registran, de ellos se ocupa el barrendero
+    rows = db.session.execute(
+        db.select(Document.id, Document.file_path, Document.file_size).where(Document.user_id.in_(user_ids))
+    ).all()
+    updates = []
+    missing = 0
+    for row in rows:
+        try:
+            size = os.stat(row.file_path).st_size
+        except OSError:
+            missing += 1
+            continue
+        if size != row.file_size:
+            updates.append({'document_id': row.id, 'actual_size': size})
+    if updates:
+        # UPDATE de Core en executemany; last_modified se conserva
+        documents = Document.__table__
+        db.session.execute(
+            db.update(documents)
+            .where(documents.c.id == db.bindparam('document_id'))
+            .values(file_size=db.bindparam('actual_size'), last_modified=documents.c.last_modified),
+            updates
+        )
+    if missing:
+        logger.warning('Reconciliación de cuotas: %s documentos sin archivo en disco', missing)
+    return len(updates)
+
+def reconcile(batch_size=RECONCILE_BATCH, check_disk=True):
+    # Reconstruye los contadores a partir de documents, por lotes de usuarios
+    # y con un commit por lote. Devuelve cuántos contadores se corrigieron.
+    fixed = 0
+    last_id = 0
+    while True:
+        user_ids = db.session.execute(
+            db.select(User.id).where(User.id > last_id).order_by(User.id).limit(batch_size)
+        ).scalars().all()
+        if not user_ids:
+            return fixed
+        last_id = user_ids[-1]
+
+        if check_disk:
+            _sync_file_sizes(user_ids)
+
+        db.session.execute(
+            db.insert(StorageUsage).from_select(
+                ['user_id'],
+                db.select(User.id).where(
+                    User.id.in_(user_ids),
+                    ~db.exists().where(StorageUsage.user_id == User.id)
+                )
+            )
+        )
+        bytes_used = (
+            db.select(db.func.coalesce(db.func.sum(Document.file_size), 0))
+            .where(Document.user_id == StorageUsage.user_id)
+            .scalar_subquery()
+        )
+        document_count = (
+            db.select(db.func.count(Document.id))
+            .where(Document.user_id == StorageUsage.user_id)
+            .scalar_subquery()
+        )
+        result = db.session.execute(
+            db.update(StorageUsage)
+            .where(
+                StorageUsage.user_id.in_(user_ids),
+                db.or_(StorageUsage.bytes_used != bytes_used, StorageUsage.document_count != document_count)
+            )
+            .values(bytes_used=bytes_used, document_count=document_count, reconciled_at=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        )
+        fixed += result.rowcount
+        db.session.commit()
+
+class QuotaReconciler:
+    def __init__(self, app, interval=86400):
+        self.app = app
+        self.interval = interval
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name='quota-reconciler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        atexit.register(self.shutdown)
+
+    def wake(self):
+        self._wake.set()
+
+    def shutdown(self):
+        self._stop.set()
+        self._wake.set()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            if self._stop.is_set():
+                return
+            try:
+                with self.app.app_context():
+                    fixed = reconcile()
+                if fixed:
+                    logger.info('Reconciliación de cuotas: %s contadores corregidos', fixed)
+            except Exception:
+                logger.exception('Error al reconciliar las cuotas de almacenamiento')
+
+def init_app(app):
+    interval = app.config.get('QUOTA_RECONCILE_INTERVAL', 0)
+    if interval <= 0:
+        return None
+    reconciler = QuotaReconciler(app, interval=interval)
+    app.extensions['quota_reconciler'] = reconciler
+    reconciler.start()
+    return reconciler
@@ -0,0 +1,273 @@
+from collections import Counter, defaultdict
+from operator import itemgetter
+import heapq
+import math
+import re
+import zipfile
+
+from sqlalchemy.exc import IntegrityError
+
+from models import db
+from models.chunk import DocumentChunk, ChunkPosting, IndexStats
+
+# Parámetros de troceado (en palabras) y de BM25
+CHUNK_SIZE = 200
+CHUNK_OVERLAP = 40
+MAX_TERM_LENGTH = 64
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Términos presentes en más de esta fracción de trozos apenas aportan (idf ~ 0)
+MAX_DF_RATIO = 0.8
+# Postings leídos por término, los de mayor tf: acota el coste de los
+# términos frecuentes, que además son los de menor idf
+MAX_TERM_POSTINGS = 200
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+_RTF_HEX_RE = re.compile(r"\\'([0-9a-fA-F]{2})")
+_RTF_CONTROL_RE = re.compile(r'\\[a-zA-Z]+-?\d* ?|\\[^a-zA-Z]|[{}]')
+_DOCX_PARAGRAPH_RE = re.compile(r'</w:p>')
+_DOCX_TEXT_RE = re.compile(r'<w:t(?: [^>]*)?>([^<]*)</w:t>|(\n)')
+_XML_ENTITIES = {'&lt;': '<', '&gt;': '>', '&amp;': '&', '&quot;': '"', '&apos;': "'"}
+
+def tokenize(text):
+    return [
+        token for token in _TOKEN_RE.findall(text.lower())
+        if 1 < len(token) <= MAX_TERM_LENGTH
+    ]
+
+def _extract_txt(path):
+    with open(path, 'rb') as f:
+        return f.read().decode('utf-8', errors='replace')
+
+def _extract_rtf(path):
+    with open(path, 'rb') as f:
+        raw = f.read().decode('latin-1')
+    raw = _RTF_HEX_RE.sub(lambda m: bytes.fromhex(m.group(1)).decode('cp1252', errors='replace'), raw)
+    return _RTF_CONTROL_RE.sub(' ', raw)
+
+def _extract_docx(path):
+    with zipfile.ZipFile(path) as archive:
+        xml = archive.read('word/document.xml').decode('utf-8', errors='replace')
+    xml = _DOCX_PARAGRAPH_RE.sub('\n', xml)
+    parts = []
+    for text, newline in _DOCX_TEXT_RE.findall(xml):
+        parts.append(newline or text)
+    text = ''.join(parts)
+    for entity, char in _XML_ENTITIES.items():
+        text = text.replace(entity, char)
+    return text
+
+def _extract_pdf(path):
+    # pypdf es opcional: sin él los PDF no se indexan
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        return ''
+    reader = PdfReader(path)
+    return '\n'.join(page.extract_text() or '' for page in reader.pages)
+
+EXTRACTORS = {
+    'txt': _extract_txt,
+    'rtf': _extract_rtf,
+    'docx': _extract_docx,
+    'pdf': _extract_pdf,
+}
+
+def extract_text(path, file_type):
+    extractor = EXTRACTORS.get(file_type)
+    if not extractor:
+        return ''
+    try:
+        return extractor(path)
+    except Exception:
+        # Un archivo corrupto no debe romper la subida
+        return ''
+
+def chunk_text(text):
+    words = text.split()
+    step = CHUNK_SIZE - CHUNK_OVERLAP
+    for start in range(0, len(words), step):
+        yield ' '.join(words[start:start + CHUNK_SIZE])
+        if start + CHUNK_SIZE >= len(words):
+            break
+
+def _bump_stats(user_id, chunk_delta, length_delta):
+    if not chunk_delta and not length_delta:
+        return
+    for _ in range(2):
+        result = db.session.execute(
+            db.update(IndexStats)
+            .where(IndexStats.user_id == user_id)
+            .values(
+                chunk_count=IndexStats.chunk_count + chunk_delta,
+                total_length=IndexStats.total_length + length_delta
+            )
+        )
+        if result.rowcount == 1:
+            return
+        try:
+            with db.session.begin_nested():
+                db.session.add(IndexStats(user_id=user_id, chunk_count=chunk_delta, total_length=length_delta))
+            return
+        except IntegrityError:
+            # Otra indexación creó la fila a la vez: se vuelve a intentar el UPDATE
+            pass
+
+def _add_chunks(user_id, entries):
+    # entries: [(document_id, position, texto)]
+    chunks = []
+    term_counts = []
+    for document_id, position, text in entries:
+        counts = Counter(tokenize(text))
+        if not counts:
+            continue
+        chunks.append(DocumentChunk(
+            document_id=document_id,
+            user_id=user_id,
+            position=position,
+            text=text,
+            length=sum(counts.values())
+        ))
+        term_counts.append(counts)
+
+    if not chunks:
+        return
+
+    db.session.add_all(chunks)
+    db.session.flush()
+
+    postings = [
+        {'user_id': user_id, 'term': term, 'chunk_id': chunk.id, 'tf': tf, 'length': chunk.length}
+        for chunk, counts in zip(chunks, term_counts)
+        for term, tf in counts.items()
+    ]
+    db.session.execute(db.insert(ChunkPosting), postings)
+    _bump_stats(user_id, len(chunks), sum(chunk.length for chunk in chunks))
+
+def _remove_chunks(user_id, *criteria):
+    count, total_length = db.session.execute(
+        db.select(db.func.count(DocumentChunk.id), db.func.coalesce(db.func.sum(DocumentChunk.length), 0))
+        .where(*criteria)
+    ).one()
+    if not count:
+        return
+
+    chunk_ids = db.select(DocumentChunk.id).where(*criteria)
+    db.session.execute(db.delete(ChunkPosting).where(ChunkPosting.chunk_id.in_(chunk_ids)))
+    db.session.execute(db.delete(DocumentChunk).where(*criteria))
+    _bump_stats(user_id, -count, -total_length)
+
+def index_document(document, text=None):
+    # Reindexa el documento completo; el llamador hace el commit
+    _remove_chunks(document.user_id, DocumentChunk.document_id == document.id)
+
+    if text is None:
+        text = extract_text(document.file_path, document.file_type)
+
+    entries = []
+    if document.description:
+        entries.append((document.id, 0, document.description))
+    entries.extend((document.id, position, chunk) for position, chunk in enumerate(chunk_text(text), start=1))
+    _add_chunks(document.user_id, entries)
+
+def index_description(document):
+    index_descriptions(document.user_id, {document.id: document.description})
+
+def index_descriptions(user_id, descriptions):
+    # Solo la descripción cambia en una actualización: no se vuelve a leer el archivo
+    _remove_chunks(
+        user_id,
+        DocumentChunk.document_id.in_(list(descriptions)),
+        DocumentChunk.position == 0
+    )
+    _add_chunks(user_id, [
+        (document_id, 0, description)
+        for document_id, description in descriptions.items()
+        if description
+    ])
+
+def remove_document(document):
+    remove_documents(document.user_id, [document.id])
+
+def remove_documents(user_id, document_ids):
+    _remove_chunks(user_id, DocumentChunk.document_id.in_(document_ids))
+
+def drop_user_index(user_id):
+    db.session.execute(db.delete(ChunkPosting).where(ChunkPosting.user_id == user_id))
+    db.session.execute(db.delete(DocumentChunk).where(DocumentChunk.user_id == user_id))
+    db.session.execute(db.delete(IndexStats).where(IndexStats.user_id == user_id))
+
+def search(user_id, query, k=5, max_tokens=None):
+    terms = list(set(tokenize(query)))
+    if not terms:
+        return []
+
+    # Consultas de Core en todo el camino de búsqueda: sin carga del ORM
+    stats = db.session.execute(
+        db.select(IndexStats.chunk_count, IndexStats.total_length).where(IndexStats.user_id == user_id)
+    ).first()
+    if not stats or stats.chunk_count <= 0:
+        return []
+
+    total = stats.chunk_count
+    avg_length = stats.total_length / total
+
+    # Las frecuencias salen solo del índice (user_id, term); así se descartan
+    # las palabras vacías antes de leer sus listas de postings
+    doc_freq = dict(db.session.execute(
+        db.select(ChunkPosting.term, db.func.count())
+        .where(ChunkPosting.user_id == user_id, ChunkPosting.term.in_(terms))
+        .group_by(ChunkPosting.term)
+    ).all())
+    if not doc_freq:
+        return []
+
+    selective = [term for term, df in doc_freq.items() if df <= total * MAX_DF_RATIO]
+    if selective:
+        doc_freq = {term: doc_freq[term] for term in selective}
+
+    # Una lectura por término recorriendo el índice (user_id, term, tf) hacia
+    # atrás: solo sus MAX_TERM_POSTINGS postings con más apariciones
+    postings = ChunkPosting.__table__
+    per_term = [
+        db.select(postings.c.chunk_id, postings.c.term, postings.c.tf, postings.c.length)
+        .where(postings.c.user_id == user_id, postings.c.term == term)
+        .order_by(postings.c.tf.desc())
+        .limit(MAX_TERM_POSTINGS)
+        .subquery()
+        for term in doc_freq
+    ]
+    rows = db.session.execute(db.union_all(*[db.select(subquery) for subquery in per_term])).all()
+
+    idf = {
+        term: math.log(1 + (total - df + 0.5) / (df + 0.5))
+        for term, df in doc_freq.items()
+    }
+
+    scores = defaultdict(float)
+    for chunk_id, term, tf, length in rows:
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * length / avg_length)
+        scores[chunk_id] += idf[term] * tf * (BM25_K1 + 1) / (tf + norm)
+
+    top = heapq.nlargest(k, scores.items(), key=itemgetter(1))
+    table = DocumentChunk.__table__
+    chunks = {
+        row.id: row._mapping
+        for row in db.session.execute(
+            db.select(table.c.id, table.c.document_id, table.c.position, table.c.text, table.c.length)
+            .where(table.c.id.in_([chunk_id for chunk_id, _ in top]))
+        )
+    }
+
+    results = []
+    budget = max_tokens
+    for chunk_id, score in top:
+        chunk = chunks[chunk_id]
+        if budget is not None:
+            if chunk['length'] > budget:
+                continue
+            budget -= chunk['length']
+        result = dict(chunk)
+        result['score'] = round(score, 4)
+        results.append(result)
+    return results
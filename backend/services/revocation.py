@@ -0,0 +1,183 @@
+from datetime import datetime, timedelta
+import hashlib
+import math
+import threading
+import time
+
+from flask import jsonify
+from sqlalchemy.exc import IntegrityError
+
+from models import db
+from models.revoked_token import RevokedToken
+from models.user import User
+
+# Vida del token más largo (refresh): pasado ese tiempo un cierre de todas
+# las sesiones ya no puede afectar a ningún token vivo
+MAX_TOKEN_LIFETIME = timedelta(days=30)
+# Cada cuánto se reconstruye el filtro para soltar los jti caducados
+REBUILD_INTERVAL = 3600
+# Margen al releer por revoked_at: cubre transacciones que confirman tarde
+# y relojes algo desfasados entre procesos
+SYNC_OVERLAP = timedelta(seconds=60)
+
+class BloomFilter:
+    # Conjunto aproximado y compacto: nunca da falsos negativos y, mientras no
+    # pase de capacity elementos, da falsos positivos con probabilidad error_rate
+    def __init__(self, capacity, error_rate):
+        self.capacity = capacity
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key):
+        # Doble hashing: las k posiciones salen de dos hashes de 64 bits
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, key):
+        for position in self._positions(key):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+_config = {'sync_interval': 5, 'capacity': 100000, 'error_rate': 0.001}
+# filter: jti revocados; cutoffs: user_id -> versión de sesión mínima que
+# se acepta en los tokens del usuario (claim 'sv')
+_state = {'filter': None, 'cutoffs': {}, 'synced_at': 0.0, 'built_at': 0.0, 'since': None}
+_sync_lock = threading.Lock()
+
+def _apply(rows, bloom, cutoffs):
+    for row in rows:
+        if row.jti is None:
+            cutoffs[row.user_id] = max(row.session_version, cutoffs.get(row.user_id, 0))
+        elif row.jti not in bloom:
+            bloom.add(row.jti)
+
+def _rows(*criteria):
+    return db.session.execute(
+        db.select(RevokedToken.jti, RevokedToken.user_id, RevokedToken.session_version).where(*criteria)
+    ).all()
+
+def _rebuild():
+    # Las filas caducadas se borran y el filtro se rehace con las vigentes
+    now = datetime.utcnow()
+    db.session.execute(db.delete(RevokedToken).where(RevokedToken.expires_at <= now))
+    db.session.commit()
+
+    rows = _rows(RevokedToken.expires_at > now)
+    # Con holgura sobre las filas vigentes: si no, al llegar a capacity cada
+    # sincronización volvería a reconstruir
+    bloom = BloomFilter(max(_config['capacity'], 2 * len(rows)), _config['error_rate'])
+    cutoffs = {}
+    _apply(rows, bloom, cutoffs)
+    _state['filter'] = bloom
+    _state['cutoffs'] = cutoffs
+    _state['since'] = now - SYNC_OVERLAP
+    _state['built_at'] = _state['synced_at'] = time.monotonic()
+
+def _sync():
+    # Solo las revocaciones nuevas desde la última pasada (más el margen)
+    now = datetime.utcnow()
+    _apply(
+        _rows(RevokedToken.revoked_at >= _state['since'], RevokedToken.expires_at > now),
+        _state['filter'],
+        _state['cutoffs']
+    )
+    _state['since'] = now - SYNC_OVERLAP
+    _state['synced_at'] = time.monotonic()
+
+def _ensure_synced():
+    now = time.monotonic()
+    if _state['filter'] is not None and now - _state['synced_at'] < _config['sync_interval']:
+        return
+    # La primera carga bloquea; después, si otro hilo ya está sincronizando,
+    # se sigue con el estado actual
+    if not _sync_lock.acquire(blocking=_state['filter'] is None):
+        return
+    try:
+        bloom = _state['filter']
+        if bloom is None or now - _state['built_at'] >= REBUILD_INTERVAL or bloom.count >= bloom.capacity:
+            _rebuild()
+        elif now - _state['synced_at'] >= _config['sync_interval']:
+            _sync()
+    finally:
+        _sync_lock.release()
+
+def _token_revoked(_jwt_header, jwt_payload):
+    # Camino rápido sin consultas: solo un acierto del filtro va a la BD
+    _ensure_synced()
+    cutoff = _state['cutoffs'].get(int(jwt_payload['sub']))
+    if cutoff is not None and jwt_payload.get('sv', 0) < cutoff:
+        return True
+
+    jti = jwt_payload['jti']
+    if jti not in _state['filter']:
+        return False
+    # Puede ser un falso positivo del filtro
+    return db.session.execute(
+        db.select(RevokedToken.id).where(RevokedToken.jti == jti)
+    ).first() is not None
+
+def _revoked_response(_jwt_header, _jwt_payload):
+    return jsonify({
+        'status': 'error',
+        'message': 'La sesión ha sido cerrada'
+    }), 401
+
+def revoke(jwt_payload):
+    # Revoca un token concreto. El llamador hace el commit; el filtro de este
+    # proceso se actualiza ya (si hubiera rollback solo queda un falso positivo
+    # que la BD descarta) y los demás procesos lo ven en su próxima sincronización.
+    jti = jwt_payload['jti']
+    if 'exp' in jwt_payload:
+        expires_at = datetime.utcfromtimestamp(jwt_payload['exp'])
+    else:
+        expires_at = datetime.utcnow() + MAX_TOKEN_LIFETIME
+    try:
+        with db.session.begin_nested():
+            db.session.add(RevokedToken(jti=jti, user_id=int(jwt_payload['sub']), expires_at=expires_at))
+    except IntegrityError:
+        # Ya estaba revocado
+        pass
+
+    bloom = _state['filter']
+    if bloom is not None and jti not in bloom:
+        bloom.add(jti)
+
+def token_claims(session_version):
+    # Claims extra de los tokens nuevos: la versión de sesión del usuario
+    return {'sv': session_version or 0}
+
+def revoke_user(user_id):
+    # Cierra todas las sesiones subiendo la versión de sesión del usuario:
+    # se rechazan los tokens con una versión anterior y los emitidos
+    # después llevan ya la nueva. El llamador hace el commit.
+    db.session.execute(
+        db.update(User)
+        .where(User.id == user_id)
+        .values(session_version=User.session_version + 1)
+        .execution_options(synchronize_session=False)
+    )
+    version = db.session.execute(db.select(User.session_version).where(User.id == user_id)).scalar_one()
+    now = datetime.utcnow()
+    db.session.add(RevokedToken(
+        user_id=user_id,
+        session_version=version,
+        revoked_at=now,
+        expires_at=now + MAX_TOKEN_LIFETIME
+    ))
+    _state['cutoffs'][user_id] = version
+
+def init_app(app, jwt):
+    _config['sync_interval'] = app.config.get('REVOCATION_SYNC_INTERVAL', 5)
+    _config['capacity'] = app.config.get('REVOCATION_FILTER_CAPACITY', 100000)
+    _config['error_rate'] = app.config.get('REVOCATION_FILTER_ERROR_RATE', 0.001)
+    # Cada app parte de cero y carga la tabla en su primera comprobación
+    _state.update(filter=None, cutoffs={}, synced_at=0.0, built_at=0.0, since=None)
+    jwt.token_in_blocklist_loader(_token_revoked)
+    jwt.revoked_token_loader(_revoked_response)
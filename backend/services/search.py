@@ -0,0 +1,114 @@
+import re
+
+from sqlalchemy import DDL, event
+
+from models import db
+from models.document import Document
+
+# El índice lo mantiene la propia base de datos (columna generada en Postgres,
+# triggers en SQLite), así que altas, cambios y borrados -incluidos los
+# masivos- quedan reflejados sin código en las rutas.
+POSTGRES_DDL = [
+    """
+    ALTER TABLE documents ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('spanish', regexp_replace(coalesce(original_filename, ''), '[_.\\-]+', ' ', 'g')), 'A') ||
+        setweight(to_tsvector('spanish', coalesce(description, '')), 'B')
+    ) STORED
+    """,
+    'CREATE INDEX IF NOT EXISTS ix_documents_search_vector ON documents USING GIN (search_vector)',
+]
+
+SQLITE_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5(
+        original_filename, description,
+        content='documents', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS documents_fts_ai AFTER INSERT ON documents BEGIN
+        INSERT INTO documents_fts(rowid, original_filename, description)
+        VALUES (new.id, new.original_filename, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS documents_fts_ad AFTER DELETE ON documents BEGIN
+        INSERT INTO documents_fts(documents_fts, rowid, original_filename, description)
+        VALUES ('delete', old.id, old.original_filename, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS documents_fts_au AFTER UPDATE OF original_filename, description ON documents BEGIN
+        INSERT INTO documents_fts(documents_fts, rowid, original_filename, description)
+        VALUES ('delete', old.id, old.original_filename, old.description);
+        INSERT INTO documents_fts(rowid, original_filename, description)
+        VALUES (new.id, new.original_filename, new.description);
+    END
+    """,
+]
+
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+for statement in POSTGRES_DDL:
+    event.listen(Document.__table__, 'after_create', DDL(statement).execute_if(dialect='postgresql'))
+for statement in SQLITE_DDL:
+    event.listen(Document.__table__, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+
+def ensure_index():
+    # Para bases de datos creadas antes de la búsqueda (create_all no vuelve a
+    # lanzar after_create sobre tablas existentes). Es idempotente.
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        for statement in POSTGRES_DDL:
+            db.session.execute(db.text(statement))
+    elif dialect == 'sqlite':
+        exists = db.session.execute(
+            db.text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'documents_fts'")
+        ).first()
+        for statement in SQLITE_DDL:
+            db.session.execute(db.text(statement))
+        if not exists:
+            db.session.execute(db.text("INSERT INTO documents_fts(documents_fts) VALUES ('rebuild')"))
+    db.session.commit()
+
+def search_documents(user_id, query, columns, limit, offset):
+    # Devuelve filas con las columnas pedidas más 'rank' (mayor es mejor)
+    words = _WORD_RE.findall(query)
+    if not words:
+        return []
+
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        tsquery = db.func.websearch_to_tsquery('spanish', query)
+        vector = db.literal_column('documents.search_vector')
+        rank = db.func.ts_rank(vector, tsquery)
+        stmt = db.select(*columns, rank.label('rank')).where(
+            Document.user_id == user_id,
+            vector.op('@@')(tsquery)
+        )
+    elif dialect == 'sqlite':
+        fts = db.table('documents_fts', db.column('rowid'))
+        # Cada palabra entre comillas: la entrada del usuario no se interpreta como sintaxis FTS5
+        match = ' '.join('"' + word + '"' for word in words)
+        rank = -db.func.bm25(db.literal_column('documents_fts'))
+        stmt = (
+            db.select(*columns, rank.label('rank'))
+            .select_from(Document)
+            .join(fts, fts.c.rowid == Document.id)
+            .where(Document.user_id == user_id, db.literal_column('documents_fts').op('MATCH')(match))
+        )
+    else:
+        # Sin índice de texto: coincidencia simple y sin ranking
+        rank = db.literal(0.0)
+        stmt = db.select(*columns, rank.label('rank')).where(
+            Document.user_id == user_id,
+            *[
+                db.or_(Document.original_filename.ilike(f'%{word}%'), Document.description.ilike(f'%{word}%'))
+                for word in words
+            ]
+        )
+
+    return db.session.execute(
+        stmt.order_by(rank.desc(), Document.id.desc()).limit(limit).offset(offset)
+    ).all()
@@ -0,0 +1,83 @@
+from datetime import date, datetime
+import decimal
+import uuid
+
+from flask import stream_with_context
+from flask.json.provider import DefaultJSONProvider
+
+# orjson es opcional: serializa datetimes de forma nativa y mucho más rápido
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+STREAM_BATCH_ROWS = 500
+STREAM_BUFFER_BYTES = 64 * 1024
+
+def _default(obj):
+    # Mismo formato que orjson (ISO 8601) también sin orjson
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, decimal.Decimal):
+        return str(obj)
+    if isinstance(obj, uuid.UUID):
+        return str(obj)
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+class JSONProvider(DefaultJSONProvider):
+    default = staticmethod(_default)
+
+    def _options(self):
+        # Mismo orden de claves que el proveedor de Flask (sort_keys)
+        option = orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return option
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None:
+            return super().dumps(obj, **kwargs)
+        option = self._options()
+        if kwargs.get('indent'):
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=_default, option=option).decode()
+
+    def dump_bytes(self, obj):
+        if orjson is None:
+            return super().dumps(obj, separators=(',', ':')).encode()
+        return orjson.dumps(obj, default=_default, option=self._options())
+
+    def loads(self, s, **kwargs):
+        if orjson is None:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        if orjson is None or (self.compact is None and self._app.debug) or self.compact is False:
+            return super().response(*args, **kwargs)
+        # Sin pasar por str: orjson ya devuelve bytes
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self.dump_bytes(obj) + b'\n', mimetype=self.mimetype)
+
+def stream_array(app, items):
+    # Genera el array JSON por partes; la memoria no depende del número de filas
+    provider = app.json
+
+    def generate():
+        buffer = bytearray(b'[')
+        first = True
+        for item in items:
+            if not first:
+                buffer += b','
+            buffer += provider.dump_bytes(item)
+            first = False
+            if len(buffer) >= STREAM_BUFFER_BYTES:
+                yield bytes(buffer)
+                buffer.clear()
+        buffer += b']\n'
+        yield bytes(buffer)
+
+    return app.response_class(stream_with_context(generate()), mimetype='application/json')
+
+def init_app(app):
+    app.json = JSONProvider(app)
@@ -0,0 +1,180 @@
+from collections import OrderedDict
+import hashlib
+import os
+import threading
+import uuid
+
+from sqlalchemy.exc import IntegrityError
+
+from models import db
+from models.document import Document
+from models.stored_file import StoredFile
+from models.tombstone import FileTombstone
+
+# Raíz con la que se escriben las rutas guardadas en la BD (relativas al
+# directorio de trabajo)
+UPLOAD_ROOT = 'uploads'
+BLOB_DIR = os.path.join(UPLOAD_ROOT, 'blobs')
+TMP_DIR = os.path.join(UPLOAD_ROOT, 'tmp')
+COPY_BUFFER = 64 * 1024
+# Hashes parciales de subidas por trozos que siguen en curso en este proceso
+MAX_PARTIAL_HASHES = 256
+
+_partial_hashes = OrderedDict()
+_partial_lock = threading.Lock()
+
+def blob_path(digest):
+    return os.path.join(BLOB_DIR, digest[:2], digest[2:4], digest)
+
+def save_stream(stream):
+    # Copia el stream a un temporal calculando el sha256 en la misma pasada
+    os.makedirs(TMP_DIR, exist_ok=True)
+    tmp_path = os.path.join(TMP_DIR, str(uuid.uuid4()))
+    digest = hashlib.sha256()
+    size = 0
+    with open(tmp_path, 'wb') as f:
+        for block in iter(lambda: stream.read(COPY_BUFFER), b''):
+            digest.update(block)
+            f.write(block)
+            size += len(block)
+    return tmp_path, digest.hexdigest(), size
+
+def hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def track_chunk(upload_id, offset, data):
+    # Mantiene el sha256 incremental de una subida por trozos mientras los
+    # trozos lleguen en orden a este proceso; si no, se recalcula al final
+    with _partial_lock:
+        entry = _partial_hashes.get(upload_id)
+        if offset == 0:
+            entry = [0, hashlib.sha256()]
+        elif entry is None or entry[0] != offset:
+            _partial_hashes.pop(upload_id, None)
+            return
+        entry[1].update(data)
+        entry[0] += len(data)
+        _partial_hashes[upload_id] = entry
+        _partial_hashes.move_to_end(upload_id)
+        while len(_partial_hashes) > MAX_PARTIAL_HASHES:
+            _partial_hashes.popitem(last=False)
+
+def finish_chunks(upload_id, path, size):
+    with _partial_lock:
+        entry = _partial_hashes.pop(upload_id, None)
+    if entry and entry[0] == size:
+        return entry[1].hexdigest()
+    return hash_file(path)
+
+def forget_chunks(upload_id):
+    with _partial_lock:
+        _partial_hashes.pop(upload_id, None)
+
+def _add_reference(digest):
+    result = db.session.execute(
+        db.update(StoredFile)
+        .where(StoredFile.digest == digest)
+        .values(ref_count=StoredFile.ref_count + 1)
+    )
+    return result.rowcount == 1
+
+def store(tmp_path, digest, size):
+    # Mueve el temporal a su ruta por contenido o, si ya existe, lo descarta
+    # y suma una referencia. El llamador hace el commit.
+    path = blob_path(digest)
+    # Si el contenido estaba pendiente de borrar se retira su tombstone. Es el
+    # punto de sincronización con el barrendero: si ya lo tiene reclamado, el
+    # DELETE espera a que termine y el archivo se mueve después de su borrado;
+    # si no, el barrendero ya no lo encontrará.
+    db.session.execute(
+        db.delete(FileTombstone)
+        .where(FileTombstone.file_path == path)
+        .execution_options(synchronize_session=False)
+    )
+    created = False
+    if not _add_reference(digest):
+        try:
+            with db.session.begin_nested():
+                db.session.add(StoredFile(digest=digest, file_path=path, size=size, ref_count=1))
+            created = True
+        except IntegrityError:
+            # Otra subida con el mismo contenido creó la fila a la vez
+            _add_reference(digest)
+
+    # La fila ya está escrita en esta transacción antes de tocar el disco
+    if created:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(tmp_path, path)
+    else:
+        os.remove(tmp_path)
+    return path
+
+def release(digest):
+    # Quita una referencia. Si era la última, la ruta va a file_tombstones y
+    # el barrendero la borra tras comprobar que ninguna subida posterior del
+    # mismo contenido la ha vuelto a crear. El llamador hace el commit.
+    db.session.execute(
+        db.update(StoredFile)
+        .where(StoredFile.digest == digest)
+        .values(ref_count=StoredFile.ref_count - 1)
+    )
+    result = db.session.execute(
+        db.delete(StoredFile)
+        .where(StoredFile.digest == digest, StoredFile.ref_count <= 0)
+        .returning(StoredFile.file_path)
+    ).first()
+    if result:
+        db.session.add(FileTombstone(file_path=result[0]))
+
+def release_document(document):
+    # Los documentos subidos antes del almacenamiento por contenido tienen su
+    # propio archivo en uploads/documents/<user_id>/
+    if document.checksum and document.file_path == blob_path(document.checksum):
+        release(document.checksum)
+    else:
+        db.session.add(FileTombstone(file_path=document.file_path))
+
+def tombstone_from(select):
+    # Las rutas del select quedan pendientes para el barrendero
+    db.session.execute(db.insert(FileTombstone).from_select(['file_path'], select))
+
+def release_documents(*criteria):
+    # Versión por conjuntos de release_document para los documentos que
+    # cumplan criteria; los archivos sin referencias van a file_tombstones.
+    # Se llama antes de borrar las filas de documents. El llamador hace el commit.
+    checksums = db.select(Document.checksum).where(*criteria, Document.checksum.isnot(None))
+
+    # Documentos anteriores al almacenamiento por contenido: archivo propio
+    tombstone_from(
+        db.select(Document.file_path).where(
+            *criteria,
+            ~db.exists().where(
+                StoredFile.digest == Document.checksum,
+                StoredFile.file_path == Document.file_path
+            )
+        )
+    )
+
+    # Quitar de cada contenido tantas referencias como documentos lo usen
+    references = (
+        db.select(db.func.count(Document.id))
+        .where(
+            *criteria,
+            Document.checksum == StoredFile.digest,
+            Document.file_path == StoredFile.file_path
+        )
+        .scalar_subquery()
+    )
+    db.session.execute(
+        db.update(StoredFile)
+        .where(StoredFile.digest.in_(checksums))
+        .values(ref_count=StoredFile.ref_count - references)
+        .execution_options(synchronize_session=False)
+    )
+    orphaned = db.and_(StoredFile.digest.in_(checksums), StoredFile.ref_count <= 0)
+    tombstone_from(db.select(StoredFile.file_path).where(orphaned))
+    db.session.execute(db.delete(StoredFile).where(orphaned).execution_options(synchronize_session=False))
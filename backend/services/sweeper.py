@@ -0,0 +1,167 @@
+from datetime import datetime, timedelta
+import atexit
+import logging
+import os
+import threading
+
+from models import db
+from models.document import Document
+from models.stored_file import StoredFile
+from models.tombstone import FileTombstone
+from models.upload import UploadSession
+from models.user import User
+from services import avatars, storage
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+# Los archivos más recientes pueden pertenecer a una subida aún sin commit
+STRAY_GRACE = timedelta(hours=1)
+STRAY_SCAN_EVERY = 360  # pasadas del barrendero entre dos búsquedas de huérfanos
+
+def _referenced(paths, lock=False):
+    # Rutas del lote que alguna fila sigue usando. Con lock, las filas de
+    # stored_files quedan bloqueadas hasta el commit del barrendero.
+    referenced = set()
+    for column in (Document.file_path, StoredFile.file_path, UploadSession.file_path, User.profile_picture):
+        query = db.select(column).where(column.in_(paths))
+        if lock and column is StoredFile.file_path:
+            query = query.with_for_update()
+        referenced.update(db.session.execute(query).scalars())
+
+    # Las variantes de avatar no tienen fila propia: siguen vivas mientras
+    # el usuario conserve el mismo avatar_hash
+    variants = {path: avatars.parse_variant_path(path) for path in paths}
+    owners = {owner for owner in variants.values() if owner}
+    if owners:
+        current = set(db.session.execute(
+            db.select(User.id, User.avatar_hash).where(User.id.in_({user_id for user_id, _ in owners}))
+        ).tuples())
+        referenced.update(path for path, owner in variants.items() if owner in current)
+    return referenced
+
+def _unlink(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    except OSError:
+        logger.warning('No se pudo borrar %s', path)
+
+def _claim_tombstones(batch_size):
+    # Se borran al reclamarlas y quedan bloqueadas hasta el commit: un store()
+    # concurrente del mismo contenido espera a que el archivo se haya borrado
+    # y otro barrendero las salta
+    claimed = (
+        db.select(FileTombstone.id)
+        .order_by(FileTombstone.id)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    )
+    return db.session.execute(
+        db.delete(FileTombstone)
+        .where(FileTombstone.id.in_(claimed))
+        .returning(FileTombstone.file_path)
+        .execution_options(synchronize_session=False)
+    ).scalars().all()
+
+def sweep_tombstones(batch_size=BATCH_SIZE):
+    removed = 0
+    while True:
+        paths = set(_claim_tombstones(batch_size))
+        if not paths:
+            db.session.commit()
+            return removed
+
+        # Un contenido puede haberse vuelto a subir después de marcarse
+        referenced = _referenced(list(paths), lock=True)
+        for path in paths:
+            if path not in referenced:
+                _unlink(path)
+                removed += 1
+        db.session.commit()
+
+def _walk_files(root):
+    for directory, _, filenames in os.walk(root):
+        for filename in filenames:
+            yield os.path.join(directory, filename)
+
+def sweep_strays(upload_folder, batch_size=BATCH_SIZE):
+    # Archivos bajo uploads/ que ninguna fila referencia. Se recorre la misma
+    # raíz con la que se escriben las rutas de la BD para que se comparen
+    # igual; si UPLOAD_FOLDER apunta a otro sitio no se borra nada.
+    if os.path.realpath(upload_folder) != os.path.realpath(storage.UPLOAD_ROOT):
+        logger.warning(
+            'UPLOAD_FOLDER (%s) no es %s: se omite la búsqueda de huérfanos',
+            upload_folder, os.path.abspath(storage.UPLOAD_ROOT)
+        )
+        return 0
+
+    cutoff = (datetime.now() - STRAY_GRACE).timestamp()
+    removed = 0
+    batch = []
+
+    def flush(batch):
+        referenced = _referenced(batch)
+        count = 0
+        for path in batch:
+            if path not in referenced:
+                _unlink(path)
+                count += 1
+        return count
+
+    for path in _walk_files(storage.UPLOAD_ROOT):
+        try:
+            if os.path.getmtime(path) > cutoff:
+                continue
+        except OSError:
+            continue
+        batch.append(path)
+        if len(batch) >= batch_size:
+            removed += flush(batch)
+            batch = []
+    if batch:
+        removed += flush(batch)
+    return removed
+
+class FileSweeper:
+    def __init__(self, app, interval=60):
+        self.app = app
+        self.interval = interval
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name='file-sweeper', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        atexit.register(self.shutdown)
+
+    def wake(self):
+        self._wake.set()
+
+    def shutdown(self):
+        self._stop.set()
+        self._wake.set()
+
+    def _loop(self):
+        passes = 0
+        while not self._stop.is_set():
+            try:
+                with self.app.app_context():
+                    sweep_tombstones()
+                    if passes and passes % STRAY_SCAN_EVERY == 0:
+                        sweep_strays(self.app.config['UPLOAD_FOLDER'])
+            except Exception:
+                logger.exception('Error en el barrendero de archivos')
+            passes += 1
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+def init_app(app):
+    interval = app.config.get('FILE_SWEEPER_INTERVAL', 0)
+    if interval <= 0:
+        return None
+    sweeper = FileSweeper(app, interval=interval)
+    app.extensions['file_sweeper'] = sweeper
+    sweeper.start()
+    return sweeper
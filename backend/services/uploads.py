@@ -0,0 +1,116 @@
+from datetime import datetime, timedelta
+import os
+
+from errors import APIError
+from models import db
+from models.upload import UploadSession
+from services import storage
+
+# Tamaño de trozo recomendado al cliente; cada trozo sigue limitado por MAX_CONTENT_LENGTH
+CHUNK_SIZE = 5 * 1024 * 1024
+COPY_BUFFER = 64 * 1024
+SESSION_TTL = timedelta(hours=24)
+
+# Firmas (offset, bytes) aceptadas por extensión. Las extensiones ausentes no se comprueban.
+MAGIC_SIGNATURES = {
+    'pdf': [(0, b'%PDF')],
+    'doc': [(0, b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1')],
+    'docx': [(0, b'PK\x03\x04')],
+    'rtf': [(0, b'{\\rtf')],
+    'jpg': [(0, b'\xff\xd8\xff')],
+    'jpeg': [(0, b'\xff\xd8\xff')],
+    'png': [(0, b'\x89PNG\r\n\x1a\n')],
+    'gif': [(0, b'GIF87a'), (0, b'GIF89a')],
+    'webp': [(8, b'WEBP')],
+    'mp3': [(0, b'ID3'), (0, b'\xff\xfb'), (0, b'\xff\xf3'), (0, b'\xff\xf2')],
+    'wav': [(8, b'WAVE')],
+    'ogg': [(0, b'OggS')],
+    'mp4': [(4, b'ftyp')],
+    'mov': [(4, b'ftyp'), (4, b'moov'), (4, b'mdat'), (4, b'wide'), (4, b'free')],
+    'avi': [(8, b'AVI ')],
+    'zip': [(0, b'PK\x03\x04'), (0, b'PK\x05\x06')],
+    'rar': [(0, b'Rar!\x1a\x07')],
+    '7z': [(0, b"7z\xbc\xaf'\x1c")],
+}
+SNIFF_LENGTH = 16
+
+def magic_matches(file_type, head):
+    signatures = MAGIC_SIGNATURES.get(file_type)
+    if signatures is None:
+        # txt: basta con que no parezca binario
+        return b'\x00' not in head
+    return any(head[offset:offset + len(magic)] == magic for offset, magic in signatures)
+
+def new_session(session_id, user_id, original_filename, file_type, file_path, total_size, description, is_public):
+    now = datetime.utcnow()
+    return UploadSession(
+        id=session_id,
+        user_id=user_id,
+        original_filename=original_filename,
+        file_type=file_type,
+        file_path=file_path,
+        total_size=total_size,
+        received=0,
+        description=description,
+        is_public=is_public,
+        created_at=now,
+        expires_at=now + SESSION_TTL
+    )
+
+def _read_head(stream):
+    head = b''
+    while len(head) < SNIFF_LENGTH:
+        block = stream.read(SNIFF_LENGTH - len(head))
+        if not block:
+            break
+        head += block
+    return head
+
+def write_chunk(session, offset, stream):
+    # Copia el cuerpo de la petición directamente al archivo .part, sin
+    # acumularlo en memoria. Devuelve el número de bytes escritos.
+    remaining = session.total_size - offset
+    pending = b''
+    if offset == 0:
+        pending = _read_head(stream)
+        if not magic_matches(session.file_type, pending):
+            raise APIError('El contenido no corresponde al tipo de archivo', 415)
+
+    mode = 'r+b' if os.path.exists(session.file_path) else 'wb'
+    written = 0
+    with open(session.file_path, mode) as f:
+        f.seek(offset)
+        block = pending or stream.read(COPY_BUFFER)
+        while block:
+            if written + len(block) > remaining:
+                raise APIError('El trozo excede el tamaño declarado del archivo', 413)
+            f.write(block)
+            storage.track_chunk(session.id, offset + written, block)
+            written += len(block)
+            block = stream.read(COPY_BUFFER)
+    return written
+
+def advance(session, offset, written):
+    # Solo avanza si nadie más escribió desde que se leyó el offset
+    result = db.session.execute(
+        db.update(UploadSession)
+        .where(UploadSession.id == session.id, UploadSession.received == offset)
+        .values(received=offset + written, expires_at=datetime.utcnow() + SESSION_TTL)
+    )
+    return result.rowcount == 1
+
+def discard(session):
+    storage.forget_chunks(session.id)
+    try:
+        os.remove(session.file_path)
+    except OSError:
+        pass
+    db.session.delete(session)
+
+def purge_expired(user_id):
+    expired = UploadSession.query.filter(
+        UploadSession.user_id == user_id,
+        UploadSession.expires_at < datetime.utcnow()
+    ).all()
+    for session in expired:
+        discard(session)
@@ -0,0 +1,42 @@
+import pytest
+from flask_jwt_extended import create_access_token
+
+from app import create_app
+from models import db
+from models.user import User
+from services import identity, revocation
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    # Las rutas guardadas son relativas al directorio de trabajo
+    monkeypatch.chdir(tmp_path)
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path / "test.db"}',
+        'DOCUMENT_JOB_WORKERS': 0,
+        'FILE_SWEEPER_INTERVAL': 0,
+        'QUOTA_RECONCILE_INTERVAL': 0,
+    })
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture
+def user(app):
+    user = User(email='ana@example.com', username='ana', first_name='Ana', last_name='Prueba')
+    db.session.add(user)
+    db.session.commit()
+    # La caché de identidades es del proceso y sobrevive entre tests
+    identity.invalidate(user.id)
+    return user
+
+@pytest.fixture
+def auth_headers(app, user):
+    # Identidad como cadena: PyJWT >= 2.10 exige que 'sub' lo sea
+    token = create_access_token(identity=str(user.id), additional_claims=revocation.token_claims(user.session_version))
+    return {'Authorization': f'Bearer {token}'}
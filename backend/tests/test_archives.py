@@ -0,0 +1,111 @@
+import io
+import zipfile
+
+import pytest
+
+from models import db
+from models.archive import ArchiveEntry
+from models.document import Document
+from services import archives
+
+def _zip(members, compression=zipfile.ZIP_DEFLATED):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', compression=compression) as archive:
+        for name, content in members.items():
+            archive.writestr(name, content)
+    return buffer.getvalue()
+
+def _upload(client, headers, content, name='paquete.zip'):
+    response = client.post(
+        '/api/documents/upload',
+        data={'file': (io.BytesIO(content), name)},
+        headers=headers,
+        content_type='multipart/form-data'
+    )
+    assert response.status_code == 201, response.get_json()
+    return response.get_json()['id']
+
+def test_lists_and_downloads_members(client, auth_headers):
+    document_id = _upload(client, auth_headers, _zip({'docs/': b'', 'docs/nota.txt': b'hola ' * 1000}))
+
+    response = client.get(f'/api/documents/{document_id}/archive', headers=auth_headers)
+    assert response.status_code == 200
+    entries = response.get_json()['entries']
+    assert [(entry['name'], entry['is_dir']) for entry in entries] == [('docs/', True), ('docs/nota.txt', False)]
+
+    response = client.get(f'/api/documents/{document_id}/archive/1', headers=auth_headers)
+    assert response.status_code == 200
+    assert response.get_data() == b'hola ' * 1000
+    assert 'nota.txt' in response.headers['Content-Disposition']
+
+    response = client.get(f'/api/documents/{document_id}/archive/0', headers=auth_headers)
+    assert response.status_code == 400
+
+def test_downloads_stored_member(client, auth_headers):
+    document_id = _upload(client, auth_headers, _zip({'datos.bin': b'\x00\x01' * 300}, zipfile.ZIP_STORED))
+
+    response = client.get(f'/api/documents/{document_id}/archive/0', headers=auth_headers)
+    assert response.get_data() == b'\x00\x01' * 300
+
+def test_rejects_archive_with_too_many_entries(app, client, auth_headers):
+    app.config['ARCHIVE_MAX_ENTRIES'] = 2
+    document_id = _upload(client, auth_headers, _zip({f'{i}.txt': b'x' for i in range(3)}))
+
+    response = client.get(f'/api/documents/{document_id}/archive', headers=auth_headers)
+    assert response.status_code == 422
+    assert db.session.get(Document, document_id).archive_entry_count is None
+
+def test_rejects_oversized_member(app, client, auth_headers):
+    app.config['ARCHIVE_MAX_MEMBER_SIZE'] = 1000
+    document_id = _upload(client, auth_headers, _zip({'grande.txt': b'x' * 2000}))
+
+    response = client.get(f'/api/documents/{document_id}/archive/0', headers=auth_headers)
+    assert response.status_code == 413
+
+def test_rejects_member_with_bomb_ratio(client, auth_headers):
+    # Ceros: más de 1000:1, por encima de ARCHIVE_MAX_RATIO y de RATIO_GRACE
+    document_id = _upload(client, auth_headers, _zip({'ceros.bin': b'\x00' * (2 * archives.RATIO_GRACE)}))
+
+    response = client.get(f'/api/documents/{document_id}/archive/0', headers=auth_headers)
+    assert response.status_code == 422
+
+def test_guard_cuts_member_that_inflates_past_declared_size():
+    blocks = iter([(10, b'x' * 10), (20, b'x' * 10)])
+
+    with pytest.raises(archives.ArchiveLimitError):
+        list(archives._guard(blocks, declared_size=15, max_ratio=100))
+
+def test_guard_cuts_member_with_wrong_crc():
+    blocks = iter([(5, b'datos')])
+
+    with pytest.raises(archives.ArchiveLimitError):
+        list(archives._guard(blocks, declared_size=5, max_ratio=100, crc=0))
+
+def test_rar_member_without_extraction_tool_is_501(client, auth_headers, monkeypatch):
+    rarfile = pytest.importorskip('rarfile')
+
+    def no_tool():
+        raise rarfile.RarCannotExec('Cannot find working tool')
+
+    monkeypatch.setattr(rarfile, 'tool_setup', no_tool)
+    document_id = _upload(client, auth_headers, b'Rar!\x1a\x07\x00', name='paquete.rar')
+    db.session.add(ArchiveEntry(document_id=document_id, position=0, name='nota.txt', size=5, compressed_size=5))
+    db.session.execute(db.update(Document).where(Document.id == document_id).values(archive_entry_count=1))
+    db.session.commit()
+
+    response = client.get(f'/api/documents/{document_id}/archive/0', headers=auth_headers)
+    assert response.status_code == 501
+
+def test_library_blocks_open_archive_only_when_iterated(tmp_path):
+    path = tmp_path / 'paquete.zip'
+    path.write_bytes(_zip({'nota.txt': b'hola'}, zipfile.ZIP_BZIP2))
+    opened = []
+
+    def open_archive():
+        opened.append(path)
+        return zipfile.ZipFile(path)
+
+    blocks = archives._library_blocks(open_archive, 0)
+    assert opened == []
+    assert [block for _, block in blocks] == [b'hola']
+    assert opened == [path]
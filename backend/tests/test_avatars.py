@@ -0,0 +1,32 @@
+import pytest
+
+from services import avatars
+
+def test_valid_image_rejects_content_not_matching_extension(tmp_path):
+    path = tmp_path / 'a.png'
+    path.write_bytes(b'not an image')
+    assert not avatars.valid_image(str(path), 'png')
+
+def test_valid_image_rejects_undecodable_image(tmp_path):
+    pytest.importorskip('PIL')
+    path = tmp_path / 'a.png'
+    path.write_bytes(b'\x89PNG\r\n\x1a\n' + b'\x00' * 32)
+    assert not avatars.valid_image(str(path), 'png')
+
+def test_render_variant_falls_back_on_unreadable_original(app, tmp_path):
+    pytest.importorskip('PIL')
+    source = tmp_path / 'original.png'
+    source.write_bytes(b'\x89PNG\r\n\x1a\n' + b'\x00' * 32)
+    avatar_hash = '0' * avatars.HASH_LENGTH
+    (tmp_path / avatars.avatar_dir(1, avatar_hash)).mkdir(parents=True)
+
+    assert avatars.render_variant(str(source), 1, avatar_hash, 64) is None
+
+def test_valid_image_rejects_decompression_bomb(tmp_path, monkeypatch):
+    Image = pytest.importorskip('PIL.Image')
+    path = tmp_path / 'a.png'
+    Image.new('RGB', (10, 10)).save(path)
+    assert avatars.valid_image(str(path), 'png')
+
+    monkeypatch.setattr(Image, 'MAX_IMAGE_PIXELS', 50)
+    assert not avatars.valid_image(str(path), 'png')
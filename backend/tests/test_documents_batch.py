@@ -0,0 +1,109 @@
+import io
+import os
+
+from models import db
+from models.document import Document
+from models.stored_file import StoredFile
+from models.tombstone import FileTombstone
+from models.user import User
+from routes import documents
+from services import quota, storage
+
+def _upload(client, headers, content, name='nota.txt'):
+    response = client.post(
+        '/api/documents/upload',
+        data={'file': (io.BytesIO(content), name)},
+        headers=headers,
+        content_type='multipart/form-data'
+    )
+    assert response.status_code == 201, response.get_json()
+    return response.get_json()
+
+def _batch(client, headers, operations):
+    return client.post('/api/documents/batch', json={'operations': operations}, headers=headers)
+
+def _foreign_document():
+    other = User(email='luis@example.com', username='luis', first_name='Luis', last_name='Prueba')
+    db.session.add(other)
+    db.session.flush()
+    document = Document(
+        filename='ajeno.txt',
+        original_filename='ajeno.txt',
+        file_path='ajeno.txt',
+        file_type='txt',
+        file_size=1,
+        user_id=other.id
+    )
+    db.session.add(document)
+    db.session.commit()
+    return document.id
+
+def test_batch_reports_each_operation_and_ignores_other_users(client, auth_headers):
+    first = _upload(client, auth_headers, b'primero')
+    second = _upload(client, auth_headers, b'segundo')
+    foreign_id = _foreign_document()
+
+    response = _batch(client, auth_headers, [
+        {'op': 'update', 'id': first['id'], 'description': 'nueva', 'is_public': True},
+        {'op': 'delete', 'id': second['id']},
+        {'op': 'delete', 'id': foreign_id},
+        {'op': 'rename', 'id': first['id']},
+    ])
+
+    assert response.status_code == 200
+    results = response.get_json()['results']
+    assert [result['status'] for result in results] == ['updated', 'deleted', 'not_found', 'invalid']
+    assert results[0]['share_token']
+
+    db.session.expire_all()
+    updated = db.session.get(Document, first['id'])
+    assert (updated.description, updated.is_public, updated.share_token) == ('nueva', True, results[0]['share_token'])
+    assert db.session.get(Document, second['id']) is None
+    assert db.session.get(Document, foreign_id) is not None
+
+def test_batch_rejects_repeated_ids_and_non_boolean_is_public(client, auth_headers):
+    document = _upload(client, auth_headers, b'contenido')
+
+    response = _batch(client, auth_headers, [
+        {'op': 'update', 'id': document['id'], 'is_public': 'false'},
+        {'op': 'update', 'id': document['id'], 'description': 'valida'},
+        {'op': 'delete', 'id': document['id']},
+    ])
+
+    results = response.get_json()['results']
+    assert results[0] == {'id': document['id'], 'status': 'invalid', 'error': 'is_public debe ser un booleano'}
+    assert results[1]['status'] == 'updated'
+    assert results[2] == {'id': document['id'], 'status': 'invalid', 'error': 'Documento repetido en el lote'}
+    db.session.expire_all()
+    assert db.session.get(Document, document['id']).is_public is False
+
+def test_batch_limits_number_of_operations(client, auth_headers, monkeypatch):
+    monkeypatch.setattr(documents, 'MAX_BATCH_OPERATIONS', 2)
+    operations = [{'op': 'delete', 'id': i} for i in range(1, 4)]
+
+    response = _batch(client, auth_headers, operations)
+
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'Máximo 2 operaciones por lote'}
+
+def test_batch_delete_releases_quota_and_tombstones_unreferenced_blobs(client, auth_headers, user):
+    shared = b'mismo contenido'
+    kept = _upload(client, auth_headers, shared)
+    copy = _upload(client, auth_headers, shared)
+    single = _upload(client, auth_headers, b'solo uno')
+
+    response = _batch(client, auth_headers, [
+        {'op': 'delete', 'id': copy['id']},
+        {'op': 'delete', 'id': single['id']},
+    ])
+    assert response.status_code == 200
+
+    usage = quota.usage(user.id)
+    assert (usage['bytes_used'], usage['document_count']) == (len(shared), 1)
+
+    # El contenido que sigue usando otro documento solo pierde una referencia
+    shared_blob = storage.blob_path(kept['filename'].rsplit('.', 1)[0])
+    single_blob = storage.blob_path(single['filename'].rsplit('.', 1)[0])
+    assert db.session.get(StoredFile, kept['filename'].rsplit('.', 1)[0]).ref_count == 1
+    assert db.session.execute(db.select(FileTombstone.file_path)).scalars().all() == [single_blob]
+    assert os.path.exists(shared_blob)
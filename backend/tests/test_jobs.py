@@ -0,0 +1,65 @@
+import threading
+
+from models import db
+from models.chunk import DocumentChunk, IndexStats
+from models.document import Document
+from models.job import ProcessingJob
+from models.user import User
+from services import jobs
+
+def _document(tmp_path, text='contenido del documento'):
+    user = User(email='ana@example.com', username='ana', first_name='Ana', last_name='Prueba')
+    db.session.add(user)
+    db.session.flush()
+    path = tmp_path / 'nota.txt'
+    path.write_text(text)
+    document = Document(
+        filename='nota.txt',
+        original_filename='nota.txt',
+        file_path=str(path),
+        file_type='txt',
+        file_size=len(text),
+        checksum='0' * 64,
+        user_id=user.id
+    )
+    db.session.add(document)
+    db.session.flush()
+    jobs.enqueue(document)
+    db.session.commit()
+    return document
+
+def _run_next(app):
+    runner = jobs.JobRunner(app, workers=1)
+    runner._process(runner._claim())
+
+def test_finished_job_is_deleted(app, tmp_path):
+    document = _document(tmp_path)
+    _run_next(app)
+
+    assert db.session.get(Document, document.id).status == 'ready'
+    assert db.session.execute(db.select(ProcessingJob)).first() is None
+    assert db.session.execute(db.select(DocumentChunk)).first() is not None
+
+def test_document_deleted_during_processing_leaves_no_chunks(app, tmp_path, monkeypatch):
+    document = _document(tmp_path)
+    document_id = document.id
+
+    def delete_elsewhere(document):
+        # Otra petición borra el documento con el trabajo ya en curso
+        document.user_id
+        def delete():
+            with app.app_context():
+                db.session.execute(db.delete(ProcessingJob).where(ProcessingJob.document_id == document_id))
+                db.session.execute(db.delete(Document).where(Document.id == document_id))
+                db.session.commit()
+                db.session.remove()
+        thread = threading.Thread(target=delete)
+        thread.start()
+        thread.join()
+
+    monkeypatch.setattr(jobs, 'STAGES', [delete_elsewhere, jobs._index_text])
+    _run_next(app)
+
+    assert db.session.execute(db.select(DocumentChunk)).first() is None
+    assert db.session.execute(db.select(IndexStats)).first() is None
+    assert db.session.execute(db.select(ProcessingJob)).first() is None
@@ -0,0 +1,41 @@
+import json
+import os
+
+from services import metrics
+
+def _counter(value):
+    return {'http_requests_total': {'type': 'counter', 'help': 'h', 'values': {'endpoint="x",status="200"': value}}}
+
+def _total(samples):
+    return samples['http_requests_total']['values'].get('endpoint="x",status="200"', 0)
+
+def _write(directory, name, samples):
+    with open(os.path.join(directory, name), 'w') as f:
+        json.dump(samples, f)
+
+def test_dead_worker_snapshots_are_folded_once(app, tmp_path, monkeypatch):
+    directory = str(tmp_path / 'metrics')
+    os.makedirs(directory)
+    monkeypatch.setitem(metrics._config, 'dir', directory)
+    monkeypatch.setattr(metrics, '_pid_alive', lambda pid: False)
+    _write(directory, '111.json', _counter(3))
+    _write(directory, '222.json', _counter(4))
+
+    assert _total(metrics.aggregate()) == 7
+    assert sorted(f for f in os.listdir(directory) if f.endswith('.json')) == ['dead.json']
+    # Una segunda lectura no vuelve a sumar lo ya acumulado
+    assert _total(metrics.aggregate()) == 7
+
+def test_reused_pid_does_not_overwrite_old_counters(app, tmp_path, monkeypatch):
+    directory = str(tmp_path / 'metrics')
+    os.makedirs(directory)
+    monkeypatch.setitem(metrics._config, 'dir', directory)
+    monkeypatch.setitem(metrics._config, 'pid', None)
+    monkeypatch.setattr(metrics.threading, 'Thread', lambda **kwargs: type('T', (), {'start': lambda self: None})())
+    monkeypatch.setattr(metrics.atexit, 'register', lambda fn: None)
+    _write(directory, f'{os.getpid()}.json', _counter(5))
+
+    metrics._start_snapshots()
+
+    assert not os.path.exists(os.path.join(directory, f'{os.getpid()}.json'))
+    assert _total(metrics.aggregate()) == 5
@@ -0,0 +1,41 @@
+import threading
+
+import pytest
+
+from errors import APIError
+from services import passwords
+
+@pytest.mark.parametrize('method', ['scrypt', 'pbkdf2', 'pbkdf2:sha256:1000'])
+def test_needs_rehash_accepts_shorthand_methods(app, method):
+    app.config['PASSWORD_HASH_METHOD'] = method
+    passwords.init_app(app)
+    password_hash = passwords.hash_password('secreto')
+
+    assert passwords.check_password(password_hash, 'secreto')
+    assert not passwords.needs_rehash(password_hash)
+
+def test_needs_rehash_detects_other_parameters(app):
+    app.config['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:1000'
+    passwords.init_app(app)
+    old_hash = passwords.hash_password('secreto')
+
+    app.config['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:2000'
+    passwords.init_app(app)
+    assert passwords.needs_rehash(old_hash)
+
+def test_saturation_sends_retry_after(app):
+    hasher = passwords._Hasher(workers=1, max_pending=1)
+    release = threading.Event()
+    worker = threading.Thread(target=hasher.run, args=('hash', release.wait))
+    worker.start()
+    try:
+        while hasher.in_flight == 0:
+            pass
+        with pytest.raises(APIError) as error:
+            hasher.run('hash', lambda: None)
+    finally:
+        release.set()
+        worker.join()
+
+    assert error.value.status_code == 503
+    assert error.value.headers == {'Retry-After': str(passwords.RETRY_AFTER)}
@@ -0,0 +1,52 @@
+import os
+
+from models import db
+from models.document import Document
+from models.user import User
+from services import public_files
+
+def _shared_document(tmp_path, email, token, content=b'contenido publico'):
+    user = User(email=email, username=email.split('@')[0], first_name='Ana', last_name='Prueba')
+    db.session.add(user)
+    db.session.flush()
+    path = tmp_path / f'{token}.txt'
+    path.write_bytes(content)
+    document = Document(
+        filename=path.name,
+        original_filename='nota.txt',
+        file_path=str(path),
+        file_type='txt',
+        file_size=len(content),
+        is_public=True,
+        share_token=token,
+        user_id=user.id
+    )
+    db.session.add(document)
+    db.session.commit()
+    return document
+
+def test_shared_file_removed_after_caching_returns_404(app, client, tmp_path):
+    document = _shared_document(tmp_path, 'ana@example.com', 'token-borrado')
+    assert client.get('/api/documents/shared/token-borrado').status_code == 200
+
+    # La entrada sigue en caché pero el archivo ya no está
+    public_files.invalidate('token-borrado')
+    public_files.lookup('token-borrado')
+    os.remove(document.file_path)
+
+    response = client.get('/api/documents/shared/token-borrado')
+    assert response.status_code == 404
+    assert response.get_json() == {'error': 'Archivo no encontrado'}
+
+def test_invalidate_user_drops_only_that_users_entries(app, tmp_path):
+    ana = _shared_document(tmp_path, 'ana@example.com', 'token-ana')
+    luis = _shared_document(tmp_path, 'luis@example.com', 'token-luis')
+    public_files.lookup('token-ana')
+    public_files.lookup('token-luis')
+
+    public_files.invalidate_user(ana.user_id)
+
+    tokens = [token for token, _ in public_files._entries.items()]
+    assert 'token-ana' not in tokens
+    assert 'token-luis' in tokens
+    assert luis.user_id != ana.user_id
@@ -0,0 +1,13 @@
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from models import db
+
+def test_failed_statement_leaves_nothing_on_the_connection(app):
+    with db.engine.connect() as connection:
+        with pytest.raises(OperationalError):
+            connection.exec_driver_sql('SELECT * FROM tabla_inexistente')
+        connection.rollback()
+        connection.exec_driver_sql('SELECT 1')
+
+        assert 'query_start' not in connection.info
@@ -0,0 +1,78 @@
+import io
+import os
+
+from models import db
+from models.document import Document
+from models.quota import StorageUsage
+from models.upload import UploadSession
+from services import quota, storage
+
+def _upload(client, headers, content, name='nota.txt'):
+    return client.post(
+        '/api/documents/upload',
+        data={'file': (io.BytesIO(content), name)},
+        headers=headers,
+        content_type='multipart/form-data'
+    )
+
+def _usage(user):
+    usage = quota.usage(user.id)
+    return usage['bytes_used'], usage['document_count']
+
+def test_upload_reserves_and_delete_releases(client, auth_headers, user):
+    document_id = _upload(client, auth_headers, b'x' * 100).get_json()['id']
+    _upload(client, auth_headers, b'y' * 50)
+    assert _usage(user) == (150, 2)
+
+    assert client.delete(f'/api/documents/{document_id}', headers=auth_headers).status_code == 204
+    assert _usage(user) == (50, 1)
+
+def test_upload_over_quota_is_refused_without_leftovers(app, client, auth_headers, user):
+    app.config['STORAGE_QUOTA_BYTES'] = 120
+    assert _upload(client, auth_headers, b'x' * 100).status_code == 201
+
+    response = _upload(client, auth_headers, b'y' * 50)
+
+    assert response.status_code == 413
+    assert _usage(user) == (100, 1)
+    assert db.session.execute(db.select(Document.id)).scalars().all() == [1]
+    # El temporal ya copiado se descarta
+    assert os.listdir(storage.TMP_DIR) == []
+
+def test_complete_over_quota_keeps_the_upload_session(app, client, auth_headers, user):
+    app.config['STORAGE_QUOTA_BYTES'] = 100
+    content = b'%PDF-' + b'x' * 95
+    upload_id = client.post(
+        '/api/documents/uploads', json={'filename': 'a.pdf', 'size': len(content)}, headers=auth_headers
+    ).get_json()['upload_id']
+    client.put(f'/api/documents/uploads/{upload_id}', data=content, headers={**auth_headers, 'Upload-Offset': '0'})
+    _upload(client, auth_headers, b'z')
+
+    response = client.post(f'/api/documents/uploads/{upload_id}/complete', headers=auth_headers)
+
+    assert response.status_code == 413
+    assert _usage(user) == (1, 1)
+    assert db.session.get(UploadSession, upload_id) is not None
+
+def test_usage_starts_from_existing_documents(app, user):
+    db.session.add(Document(
+        filename='antiguo.txt', original_filename='antiguo.txt', file_path='antiguo.txt',
+        file_type='txt', file_size=70, user_id=user.id
+    ))
+    db.session.commit()
+
+    assert _usage(user) == (70, 1)
+
+def test_reconcile_fixes_drifted_counters_and_file_sizes(app, client, auth_headers, user):
+    document_id = _upload(client, auth_headers, b'x' * 100).get_json()['id']
+    document = db.session.get(Document, document_id)
+    db.session.execute(db.update(StorageUsage).values(bytes_used=999, document_count=5))
+    db.session.execute(db.update(Document).values(file_size=10))
+    db.session.commit()
+
+    assert quota.reconcile() == 1
+
+    db.session.expire_all()
+    assert _usage(user) == (100, 1)
+    assert db.session.get(Document, document_id).file_size == os.path.getsize(document.file_path)
+    assert quota.reconcile() == 0
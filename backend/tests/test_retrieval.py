@@ -0,0 +1,57 @@
+from models import db
+from models.chunk import IndexStats
+from models.document import Document
+from models.user import User
+from services import retrieval
+
+def _user(email='ana@example.com'):
+    user = User(email=email, username=email.split('@')[0], first_name='Ana', last_name='Prueba')
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+def _index(user, text, name='nota.txt'):
+    document = Document(
+        filename=name,
+        original_filename=name,
+        file_path=name,
+        file_type='txt',
+        file_size=0,
+        user_id=user.id
+    )
+    db.session.add(document)
+    db.session.flush()
+    retrieval.index_document(document, text=text)
+    db.session.commit()
+    return document
+
+def test_bump_stats_retries_update_when_row_appears_concurrently(app, monkeypatch):
+    user = _user()
+    begin_nested = db.session.begin_nested
+
+    def racing_begin_nested():
+        # Otra indexación crea la fila entre el UPDATE y el INSERT de esta
+        db.session.execute(db.insert(IndexStats).values(user_id=user.id, chunk_count=2, total_length=20))
+        monkeypatch.setattr(db.session, 'begin_nested', begin_nested)
+        return begin_nested()
+
+    monkeypatch.setattr(db.session, 'begin_nested', racing_begin_nested)
+    retrieval._bump_stats(user.id, 3, 30)
+    db.session.commit()
+
+    stats = db.session.get(IndexStats, user.id)
+    assert (stats.chunk_count, stats.total_length) == (5, 50)
+
+def test_search_reads_top_postings_by_tf_per_term(app, monkeypatch):
+    user = _user()
+    for i in range(3):
+        _index(user, f'comun relleno{i}', name=f'comun-{i}.txt')
+        _index(user, f'otro texto{i}', name=f'otro-{i}.txt')
+    frequent = _index(user, 'comun comun comun', name='frecuente.txt')
+    monkeypatch.setattr(retrieval, 'MAX_TERM_POSTINGS', 1)
+
+    results = retrieval.search(user.id, 'comun', k=5)
+
+    # Solo se lee el posting de 'comun' con más apariciones
+    assert [result['document_id'] for result in results] == [frequent.id]
+    assert set(results[0]) == {'id', 'document_id', 'position', 'text', 'length', 'score'}
@@ -0,0 +1,94 @@
+from datetime import datetime, timedelta
+import time
+import uuid
+
+from models import db
+from models.revoked_token import RevokedToken
+from models.user import User
+from services import revocation
+
+def _user(email='ana@example.com'):
+    user = User(email=email, username=email.split('@')[0], first_name='Ana', last_name='Prueba')
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+def _payload(user_id, sv=0):
+    return {'sub': user_id, 'jti': str(uuid.uuid4()), 'sv': sv, 'exp': int(time.time()) + 3600}
+
+def _revoked(payload):
+    return revocation._token_revoked({}, payload)
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = revocation.BloomFilter(1000, 0.01)
+    keys = [str(uuid.uuid4()) for _ in range(1000)]
+    for key in keys:
+        bloom.add(key)
+
+    assert all(key in bloom for key in keys)
+    false_positives = sum(str(uuid.uuid4()) in bloom for _ in range(10000))
+    assert false_positives < 300
+
+def test_revoked_jti_is_rejected(app):
+    user = _user()
+    token, other = _payload(user.id), _payload(user.id)
+    revocation.revoke(token)
+    db.session.commit()
+
+    assert _revoked(token)
+    assert not _revoked(other)
+
+def test_filter_false_positive_is_checked_in_db(app):
+    token = _payload(1)
+    revocation._ensure_synced()
+    revocation._state['filter'].add(token['jti'])
+
+    assert not _revoked(token)
+
+def test_revocations_from_other_processes_arrive_on_next_sync(app):
+    token = _payload(1)
+    revocation._ensure_synced()
+    db.session.add(RevokedToken(jti=token['jti'], user_id=1, expires_at=datetime.utcnow() + timedelta(hours=1)))
+    db.session.commit()
+
+    assert not _revoked(token)
+    revocation._state['synced_at'] -= revocation._config['sync_interval']
+    assert _revoked(token)
+
+def test_logout_all_rejects_older_tokens_only(app):
+    user = _user()
+    old = _payload(user.id, sv=user.session_version)
+    revocation.revoke_user(user.id)
+    db.session.commit()
+    db.session.refresh(user)
+    # Emitido en el mismo segundo que el cierre, pero con la versión nueva
+    new = _payload(user.id, sv=user.session_version)
+
+    assert _revoked(old)
+    assert not _revoked(new)
+
+    # Otro proceso que carga el estado desde la BD
+    revocation._state['filter'] = None
+    assert _revoked(old)
+    assert not _revoked(new)
+
+def test_rebuild_sizes_filter_from_live_rows(app, monkeypatch):
+    monkeypatch.setitem(revocation._config, 'capacity', 4)
+    expires_at = datetime.utcnow() + timedelta(hours=1)
+    db.session.add_all(
+        RevokedToken(jti=str(uuid.uuid4()), user_id=1, expires_at=expires_at) for _ in range(10)
+    )
+    db.session.add(RevokedToken(jti=str(uuid.uuid4()), user_id=1, expires_at=datetime.utcnow() - timedelta(seconds=1)))
+    db.session.commit()
+
+    revocation._ensure_synced()
+    bloom = revocation._state['filter']
+    built_at = revocation._state['built_at']
+    assert bloom.count == 10
+    assert bloom.capacity >= 20
+    assert db.session.execute(db.select(db.func.count(RevokedToken.id))).scalar() == 10
+
+    # La siguiente sincronización es incremental, no otra reconstrucción
+    revocation._state['synced_at'] -= revocation._config['sync_interval']
+    revocation._ensure_synced()
+    assert revocation._state['built_at'] == built_at
@@ -0,0 +1,19 @@
+from datetime import datetime
+
+import pytest
+
+DATA = {'b': 1, 'a': {'d': 2, 'c': 3}, 'fecha': datetime(2024, 1, 2, 3, 4, 5)}
+
+def test_keys_sorted_like_flask_default(app):
+    assert app.json.dump_bytes(DATA) == b'{"a":{"c":3,"d":2},"b":1,"fecha":"2024-01-02T03:04:05"}'
+
+    with app.test_request_context():
+        response = app.json.response(DATA)
+    body = response.get_data()
+    assert body.index(b'"a"') < body.index(b'"c"') < body.index(b'"d"') < body.index(b'"b"')
+
+def test_orjson_keeps_insertion_order_when_sort_keys_is_off(app, monkeypatch):
+    pytest.importorskip('orjson')
+    monkeypatch.setattr(app.json, 'sort_keys', False)
+
+    assert app.json.dump_bytes({'b': 1, 'a': 2}) == b'{"b":1,"a":2}'
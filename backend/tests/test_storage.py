@@ -0,0 +1,92 @@
+import hashlib
+import io
+import os
+import threading
+
+from models import db
+from models.stored_file import StoredFile
+from models.tombstone import FileTombstone
+from services import storage, sweeper
+
+def _store(content):
+    tmp_path, digest, size = storage.save_stream(io.BytesIO(content))
+    path = storage.store(tmp_path, digest, size)
+    db.session.commit()
+    return digest, path
+
+def _ref_count(digest):
+    return db.session.execute(
+        db.select(StoredFile.ref_count).where(StoredFile.digest == digest)
+    ).scalar()
+
+def _tombstones():
+    return db.session.execute(db.select(FileTombstone.file_path)).scalars().all()
+
+def test_store_same_content_adds_reference(app):
+    digest, path = _store(b'mismo contenido')
+    again_digest, again_path = _store(b'mismo contenido')
+
+    assert digest == again_digest == hashlib.sha256(b'mismo contenido').hexdigest()
+    assert path == again_path == storage.blob_path(digest)
+    assert _ref_count(digest) == 2
+    assert os.listdir(storage.TMP_DIR) == []
+
+def test_release_tombstones_only_the_last_reference(app):
+    digest, path = _store(b'contenido')
+    _store(b'contenido')
+
+    storage.release(digest)
+    db.session.commit()
+    assert _ref_count(digest) == 1
+    assert _tombstones() == []
+
+    storage.release(digest)
+    db.session.commit()
+    assert _ref_count(digest) is None
+    assert _tombstones() == [path]
+    # El archivo sigue ahí hasta que pasa el barrendero
+    assert os.path.exists(path)
+
+    sweeper.sweep_tombstones()
+    assert not os.path.exists(path)
+    assert _tombstones() == []
+
+def test_sweeper_keeps_blob_reuploaded_after_release(app):
+    digest, path = _store(b'contenido')
+    storage.release(digest)
+    db.session.commit()
+
+    # Una subida del mismo contenido entre el commit y el borrado
+    _store(b'contenido')
+    sweeper.sweep_tombstones()
+
+    assert os.path.exists(path)
+    assert _ref_count(digest) == 1
+
+def test_sweeper_waits_for_uncommitted_reupload(app):
+    digest, path = _store(b'contenido')
+    storage.release(digest)
+    db.session.commit()
+
+    # Subida del mismo contenido con el blob ya movido pero sin commit
+    tmp_path, _, size = storage.save_stream(io.BytesIO(b'contenido'))
+    storage.store(tmp_path, digest, size)
+
+    swept = []
+
+    def sweep():
+        with app.app_context():
+            swept.append(sweeper.sweep_tombstones())
+            db.session.remove()
+
+    thread = threading.Thread(target=sweep)
+    thread.start()
+    thread.join(0.5)
+    db.session.commit()
+    thread.join()
+
+    # El barrendero esperó al commit y ya no encontró el tombstone
+    assert swept == [0]
+    assert os.path.exists(path)
+    assert _ref_count(digest) == 1
+    assert _tombstones() == []
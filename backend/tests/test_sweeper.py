@@ -0,0 +1,32 @@
+import os
+
+from models import db
+from models.stored_file import StoredFile
+from services import storage, sweeper
+
+def _old_file(path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(b'contenido')
+    old = (sweeper.datetime.now() - 2 * sweeper.STRAY_GRACE).timestamp()
+    os.utime(path, (old, old))
+
+def test_sweep_strays_keeps_referenced_files_with_other_folder_spelling(app):
+    digest = 'ab' * 32
+    live = storage.blob_path(digest)
+    stray = os.path.join('uploads', 'documents', '1', 'huerfano.pdf')
+    _old_file(live)
+    _old_file(stray)
+    db.session.add(StoredFile(digest=digest, file_path=live, size=9, ref_count=1))
+    db.session.commit()
+
+    assert sweeper.sweep_strays('./uploads') == 1
+    assert os.path.exists(live)
+    assert not os.path.exists(stray)
+
+def test_sweep_strays_refuses_other_roots(app, tmp_path):
+    stray = os.path.join('uploads', 'documents', '1', 'huerfano.pdf')
+    _old_file(stray)
+
+    assert sweeper.sweep_strays(str(tmp_path / 'otra')) == 0
+    assert os.path.exists(stray)
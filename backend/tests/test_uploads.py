@@ -0,0 +1,66 @@
+import hashlib
+
+from models import db
+from models.document import Document
+from models.upload import UploadSession
+
+CONTENT = b'%PDF-1.4 ' + b'x' * 100
+
+def _init(client, headers, size=len(CONTENT), **extra):
+    return client.post('/api/documents/uploads', json={'filename': 'informe.pdf', 'size': size, **extra}, headers=headers)
+
+def _put(client, headers, upload_id, offset, data):
+    return client.put(
+        f'/api/documents/uploads/{upload_id}',
+        data=data,
+        headers={**headers, 'Upload-Offset': str(offset)}
+    )
+
+def test_chunked_upload_completes_into_document(client, auth_headers):
+    upload_id = _init(client, auth_headers).get_json()['upload_id']
+
+    assert _put(client, auth_headers, upload_id, 0, CONTENT[:50]).get_json()['offset'] == 50
+    assert _put(client, auth_headers, upload_id, 50, CONTENT[50:]).get_json()['offset'] == len(CONTENT)
+    response = client.post(f'/api/documents/uploads/{upload_id}/complete', headers=auth_headers)
+
+    assert response.status_code == 201
+    document = db.session.get(Document, response.get_json()['id'])
+    assert document.checksum == hashlib.sha256(CONTENT).hexdigest()
+    assert document.file_size == len(CONTENT)
+    with open(document.file_path, 'rb') as f:
+        assert f.read() == CONTENT
+    assert db.session.get(UploadSession, upload_id) is None
+
+def test_chunk_with_wrong_offset_is_rejected(client, auth_headers):
+    upload_id = _init(client, auth_headers).get_json()['upload_id']
+    _put(client, auth_headers, upload_id, 0, CONTENT[:50])
+
+    response = _put(client, auth_headers, upload_id, 10, CONTENT[10:60])
+    assert response.status_code == 409
+    assert response.get_json()['offset'] == 50
+
+    # Incompleta: no se puede cerrar todavía
+    response = client.post(f'/api/documents/uploads/{upload_id}/complete', headers=auth_headers)
+    assert response.status_code == 409
+    assert response.get_json()['offset'] == 50
+
+def test_first_chunk_must_match_file_type(client, auth_headers):
+    upload_id = _init(client, auth_headers).get_json()['upload_id']
+
+    response = _put(client, auth_headers, upload_id, 0, b'no es un pdf' + b'x' * 97)
+    assert response.status_code == 415
+
+def test_chunk_past_declared_size_is_rejected(client, auth_headers):
+    upload_id = _init(client, auth_headers, size=20).get_json()['upload_id']
+
+    response = _put(client, auth_headers, upload_id, 0, CONTENT)
+    assert response.status_code == 413
+
+def test_init_requires_boolean_is_public(client, auth_headers):
+    response = _init(client, auth_headers, is_public='false')
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'is_public debe ser un booleano'}
+
+    response = _init(client, auth_headers, is_public=True)
+    assert response.status_code == 201
+    assert db.session.get(UploadSession, response.get_json()['upload_id']).is_public is True
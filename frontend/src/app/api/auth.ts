@@ -44,8 +44,20 @@ export const auth = {
         return response.data;
     },
 
-    logout: () => {
-        localStorage.removeItem('token');
+    logout: async () => {
+        try {
+            await api.post('/auth/logout');
+        } finally {
+            localStorage.removeItem('token');
+        }
+    },
+
+    logoutAll: async () => {
+        try {
+            await api.post('/auth/logout-all');
+        } finally {
+            localStorage.removeItem('token');
+        }
     },
 
     getCurrentUser: async () => {
@@ -120,6 +132,26 @@ export const documents = {
         await api.delete(`/documents/${id}`);
     },
 
+    batch: async (operations: Array<
+        | { op: 'update'; id: number; description?: string; is_public?: boolean }
+        | { op: 'delete'; id: number }
+    >) => {
+        const response = await api.post('/documents/batch', { operations });
+        return response.data;
+    },
+
+    archive: async (id: number) => {
+        const response = await api.get(`/documents/${id}/archive`);
+        return response.data;
+    },
+
+    archiveEntry: async (id: number, position: number) => {
+        const response = await api.get(`/documents/${id}/archive/${position}`, {
+            responseType: 'blob',
+        });
+        return response.data;
+    },
+
     download: async (id: number) => {
         const response = await api.get(`/documents/${id}/download`, {
             responseType: 'blob',
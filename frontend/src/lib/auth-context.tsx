@@ -99,6 +99,14 @@ export function AuthProvider({ children }: { children: ReactNode }) {
   };
 
   const logout = () => {
+    // Revocar los tokens en el servidor; la sesión local se cierra igualmente
+    if (accessToken) {
+      axios.post(
+        'http://localhost:5000/api/auth/logout',
+        { refresh_token: refreshToken },
+        { headers: { Authorization: `Bearer ${accessToken}` } }
+      ).catch(() => {});
+    }
     localStorage.removeItem('accessToken');
     localStorage.removeItem('refreshToken');
     setUser(null);